@@ -0,0 +1,72 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from users.models import User
+from .cache import is_shared_cache
+
+SNAPSHOT_FIELDS = ('id', 'is_staff', 'is_active')
+
+
+def token_cache_key(key):
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_token(key):
+    cache.delete(token_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    """Сбрасывает кеш токена пользователя. Вызывается сигналами при
+    save()/delete(); после QuerySet.update() пользователей его нужно
+    вызвать явно."""
+    key = cache.get(user_cache_key(user_id))
+    if key is not None:
+        cache.delete_many((token_cache_key(key), user_cache_key(user_id)))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешированием пользователя.
+
+    В кеше хранится снимок (id, is_staff, is_active) по токену. При
+    попадании в кеш пользователь создаётся без запроса к базе, остальные
+    поля отложены и загружаются одним запросом при первом обращении.
+    Кеш сбрасывается при удалении токена (выход) и при сохранении
+    пользователя (смена пароля, деактивация), см. api.signals. Сброс
+    виден другим воркерам только в общем кеше, поэтому с локальным
+    кешем (LocMemCache) токен каждый раз проверяется по базе.
+
+    Сигналы не срабатывают при QuerySet.update() и удалении строк в
+    обход ORM: после таких изменений нужно вызвать
+    invalidate_user_tokens, иначе снимок действует до истечения
+    AUTH_TOKEN_CACHE_TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_shared_cache():
+            return super().authenticate_credentials(key)
+        snapshot = cache.get(token_cache_key(key))
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set_many(
+                {token_cache_key(key): tuple(
+                    getattr(user, field) for field in SNAPSHOT_FIELDS),
+                 user_cache_key(user.id): key},
+                settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            return user, token
+
+        user = User.from_db(router.db_for_read(User), SNAPSHOT_FIELDS,
+                            snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,102 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from recipes.models import Ingredient, Tag
+from recipes.services import get_last_change
+
+TAGS_CACHE_KEY = 'reference:tags'
+INGREDIENTS_CACHE_KEY = 'reference:ingredients'
+RECIPE_PAGE_CACHE_PREFIX = 'recipes:page'
+RECIPE_DETAIL_CACHE_PREFIX = 'recipes:detail'
+
+
+def is_shared_cache(alias='default'):
+    """Общий ли кеш для всех процессов (не LocMemCache/DummyCache)."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def reference_cache_timeout():
+    """Время жизни справочников в кеше.
+
+    Сигналы api.signals сбрасывают кеш только в процессе, где изменён тег
+    или ингредиент, поэтому в локальном кеше справочники живут недолго.
+    """
+    if is_shared_cache():
+        return settings.REFERENCE_CACHE_TIMEOUT
+    return settings.LOCAL_REFERENCE_CACHE_TIMEOUT
+
+
+def get_tags():
+    """Список тегов в виде готовых к отдаче словарей."""
+    tags = cache.get(TAGS_CACHE_KEY)
+    if tags is None:
+        tags = list(Tag.objects.order_by('id').values(
+            'id', 'name', 'color', 'slug'))
+        cache.set(TAGS_CACHE_KEY, tags, reference_cache_timeout())
+    return tags
+
+
+def get_tag_ids_by_slug():
+    """Словарь slug -> id тегов."""
+    return {tag['slug']: tag['id'] for tag in get_tags()}
+
+
+def get_ingredients():
+    """Список ингредиентов в виде готовых к отдаче словарей."""
+    ingredients = cache.get(INGREDIENTS_CACHE_KEY)
+    if ingredients is None:
+        ingredients = list(Ingredient.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit'))
+        cache.set(INGREDIENTS_CACHE_KEY, ingredients,
+                  reference_cache_timeout())
+    return ingredients
+
+
+def invalidate_tags():
+    cache.delete(TAGS_CACHE_KEY)
+
+
+def invalidate_ingredients():
+    cache.delete(INGREDIENTS_CACHE_KEY)
+
+
+def warm_reference_cache():
+    """Заполняет кеш справочников, возвращает число записей."""
+    invalidate_tags()
+    invalidate_ingredients()
+    return {'tags': len(get_tags()), 'ingredients': len(get_ingredients())}
+
+
+def get_data_version():
+    """Позиция последнего изменения рецептов, тегов и ингредиентов в
+    журнале (recipes.services.get_last_change)."""
+    return get_last_change()
+
+
+def recipe_page_cache_key(request):
+    """Ключ страницы списка рецептов для анонимного пользователя.
+
+    Ключ включает версию данных, поэтому любое изменение рецептов, тегов
+    или ингредиентов делает закешированные страницы неактуальными.
+    """
+    query = sorted((name, sorted(values))
+                   for name, values in request.query_params.lists())
+    parts = (get_data_version(), request.build_absolute_uri(request.path),
+             query)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'{RECIPE_PAGE_CACHE_PREFIX}:{digest}'
+
+
+def recipe_detail_cache_key(request, etag):
+    """Ключ рецепта для анонимного пользователя по его ETag.
+
+    ETag меняется вместе с рецептом; адрес сайта входит в ключ, так как
+    ссылки на изображения в ответе абсолютные.
+    """
+    parts = (etag, request.build_absolute_uri('/'))
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'{RECIPE_DETAIL_CACHE_PREFIX}:{digest}'
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import is_shared_cache
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared_cache():
+        return []
+    return [Warning(
+        'Кеш default локален для процесса: токены проверяются по базе, '
+        'а справочники в разных воркерах обновляются с задержкой.',
+        hint='Задайте CACHE_BACKEND и CACHE_LOCATION общего кеша '
+             '(memcached, см. infra/docker-compose.yml).',
+        id='api.W001')]
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_throttle_cache(app_configs, **kwargs):
+    if is_shared_cache(settings.THROTTLE_CACHE_ALIAS):
+        return []
+    return [Warning(
+        f'Кеш {settings.THROTTLE_CACHE_ALIAS} локален для процесса: '
+        f'каждый воркер считает запросы отдельно, и ограничения частоты '
+        f'умножаются на число воркеров.',
+        hint='Задайте THROTTLE_CACHE_BACKEND и THROTTLE_CACHE_LOCATION '
+             'общего кеша (memcached, см. infra/docker-compose.yml).',
+        id='api.W002')]
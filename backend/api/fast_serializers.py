@@ -0,0 +1,167 @@
+"""Быстрая сериализация списков только для чтения.
+
+Функции возвращают те же словари, что RecipeSerializer, UserInfoSerializer
+и FollowSerializer, но строят их из values()-строк страницы и нескольких
+пакетных запросов на всю страницу, без полей DRF. Порядок ключей и
+значения совпадают с обычными сериализаторами. Параметр fields задаёт
+поля ответа: для невыбранных полей не выбираются столбцы и не
+выполняются запросы.
+"""
+from collections import defaultdict
+
+from django.db.models import Count
+
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Follow, User
+from .cache import get_tags, invalidate_tags
+from .serializers import FollowSerializer, RecipeSerializer, UserInfoSerializer
+
+RECIPE_COLUMNS = {'author': 'author_id', 'name': 'name', 'image': 'image',
+                  'text': 'text', 'cooking_time': 'cooking_time'}
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
+USER_COLUMNS = ('email', 'username', 'first_name', 'last_name')
+
+image_storage = Recipe._meta.get_field('image').storage
+
+
+def recipe_columns(fields=RecipeSerializer.Meta.fields):
+    """Столбцы Recipe, нужные для полей ответа fields."""
+    return ['id', *(RECIPE_COLUMNS[name] for name in fields
+                    if name in RECIPE_COLUMNS)]
+
+
+def user_columns(fields=UserInfoSerializer.Meta.fields):
+    """Столбцы User, нужные для полей ответа fields."""
+    return ['id', *(name for name in fields if name in USER_COLUMNS)]
+
+
+def image_url(name, request):
+    """Аналог ImageField.to_representation для имени файла."""
+    if not name:
+        return None
+    url = image_storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _user_ids(request, model, field, ids):
+    user = request.user
+    if user.is_anonymous or not ids:
+        return set()
+    return set(model.objects.filter(
+        user=user, **{f'{field}__in': ids}).values_list(field, flat=True))
+
+
+def _tags_by_id(tag_ids):
+    tags = {tag['id']: tag for tag in get_tags()}
+    if not tags.keys() >= tag_ids:
+        invalidate_tags()
+        tags = {tag['id']: tag for tag in get_tags()}
+    return tags
+
+
+def _recipe_tags(ids):
+    recipe_tags = list(Recipe.tags.through.objects.filter(
+        recipe_id__in=ids).order_by('tag_id').values_list('recipe_id',
+                                                          'tag_id'))
+    tags = _tags_by_id({tag_id for _, tag_id in recipe_tags})
+    tags_by_recipe = defaultdict(list)
+    for recipe_id, tag_id in recipe_tags:
+        tags_by_recipe[recipe_id].append(dict(tags[tag_id]))
+    return tags_by_recipe
+
+
+def _recipe_ingredients(ids):
+    ingredients = defaultdict(list)
+    for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+            recipe_id__in=ids).order_by('id').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'):
+        ingredients[recipe_id].append(dict(zip(
+            ('id', 'name', 'measurement_unit', 'amount'), ingredient)))
+    return ingredients
+
+
+def serialize_users(rows, request, fields=UserInfoSerializer.Meta.fields):
+    """Строки User.values(*user_columns(fields)) -> UserInfoSerializer."""
+    subscribed = set()
+    if 'is_subscribed' in fields:
+        subscribed = _user_ids(request, Follow, 'author_id',
+                               [row['id'] for row in rows])
+    return [{name: row['id'] in subscribed if name == 'is_subscribed'
+             else row[name] for name in fields} for row in rows]
+
+
+def serialize_short_recipes(rows, request):
+    """Строки Recipe.values(*SHORT_RECIPE_FIELDS) -> ShortRecipeSerializer."""
+    return [{'id': row['id'], 'name': row['name'],
+             'image': image_url(row['image'], request),
+             'cooking_time': row['cooking_time']} for row in rows]
+
+
+def serialize_recipes(rows, request, fields=RecipeSerializer.Meta.fields,
+                      author_fields=UserInfoSerializer.Meta.fields):
+    """Строки Recipe.values(*recipe_columns(fields)) -> RecipeSerializer."""
+    ids = [row['id'] for row in rows]
+    if not ids:
+        return []
+
+    tags = _recipe_tags(ids) if 'tags' in fields else None
+    ingredients = (_recipe_ingredients(ids) if 'ingredients' in fields
+                   else None)
+    authors = None
+    if 'author' in fields:
+        authors = {author['id']: author for author in serialize_users(
+            User.objects.filter(
+                id__in={row['author_id'] for row in rows}).values(
+                *user_columns(author_fields)), request, author_fields)}
+    favorited = (_user_ids(request, Favorite, 'recipe_id', ids)
+                 if 'is_favorited' in fields else None)
+    in_cart = (_user_ids(request, ShoppingCart, 'recipe_id', ids)
+               if 'is_in_shopping_cart' in fields else None)
+
+    values = {
+        'id': lambda row: row['id'],
+        'tags': lambda row: tags[row['id']],
+        'author': lambda row: dict(authors[row['author_id']]),
+        'ingredients': lambda row: ingredients[row['id']],
+        'name': lambda row: row['name'],
+        'image': lambda row: image_url(row['image'], request),
+        'text': lambda row: row['text'],
+        'cooking_time': lambda row: row['cooking_time'],
+        'is_favorited': lambda row: row['id'] in favorited,
+        'is_in_shopping_cart': lambda row: row['id'] in in_cart,
+    }
+    return [{name: values[name](row) for name in fields} for row in rows]
+
+
+def serialize_follows(rows, request, fields=FollowSerializer.Meta.fields):
+    """Строки User.values(*user_columns(fields)) -> FollowSerializer."""
+    author_ids = [row['id'] for row in rows]
+    recipes = defaultdict(list)
+    counts = {}
+    if 'recipes' in fields:
+        recipe_rows = list(Recipe.objects.filter(
+            author_id__in=author_ids, is_active=True).values(
+            'author_id', *SHORT_RECIPE_FIELDS))
+        for row, recipe in zip(recipe_rows,
+                               serialize_short_recipes(recipe_rows, request)):
+            recipes[row['author_id']].append(recipe)
+        counts = {author_id: len(items)
+                  for author_id, items in recipes.items()}
+    elif 'recipes_count' in fields:
+        counts = dict(Recipe.objects.filter(
+            author_id__in=author_ids, is_active=True).values(
+            'author_id').annotate(count=Count('id')).values_list(
+            'author_id', 'count').order_by())
+
+    users = serialize_users(
+        rows, request, [name for name in UserInfoSerializer.Meta.fields
+                        if name in fields])
+    for row, user in zip(rows, users):
+        if 'recipes' in fields:
+            user['recipes'] = recipes[row['id']]
+        if 'recipes_count' in fields:
+            user['recipes_count'] = counts.get(row['id'], 0)
+    return users
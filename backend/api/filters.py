@@ -1,7 +1,8 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import filters, FilterSet
 
-from recipes.models import Ingredient, Recipe, Tag
-from users.models import User
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from .cache import get_tag_ids_by_slug
 
 
 class IngredientFilter(FilterSet):
@@ -14,26 +15,43 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    """Фильтрация в рецептах."""
-    tags = filters.ModelMultipleChoiceFilter(queryset=Tag.objects.all(),
-                                             field_name='tags__slug',
-                                             to_field_name='slug', )
-    author = filters.ModelChoiceFilter(queryset=User.objects.all(), )
+    """Фильтрация в рецептах.
+    
+    Все фильтры по связанным таблицам сделаны через EXISTS: рецепт не
+    дублируется, если подходит несколько тегов, и DISTINCT не нужен.
+    Слаги тегов проверяются по кешу справочника, без запроса к Tag.
+    """
+    tags = filters.MultipleChoiceFilter(method='get_tags')
+    author = filters.NumberFilter(field_name='author_id')
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart', )
     
-    def get_is_favorited(self, queryset, name, value):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tag_ids = get_tag_ids_by_slug()
+        self.filters['tags'].extra['choices'] = [
+            (slug, slug) for slug in self.tag_ids]
+    
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[self.tag_ids[slug] for slug in value])))
+    
+    def filter_by_user(self, queryset, model, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(Exists(model.objects.filter(
+                user=user, recipe_id=OuterRef('pk'))))
         return queryset
     
+    def get_is_favorited(self, queryset, name, value):
+        return self.filter_by_user(queryset, Favorite, value)
+    
     def get_is_in_shopping_cart(self, queryset, name, value):
-        user = self.request.user
-        if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        return queryset
+        return self.filter_by_user(queryset, ShoppingCart, value)
     
     class Meta:
         model = Recipe
@@ -0,0 +1,69 @@
+import io
+import statistics
+import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Сравнение скорости JSON-рендереров и парсеров на рецептах."""
+    help = ('Сериализует рецепты RecipeSerializer и сравнивает JSONRenderer '
+            'и FastJSONRenderer (а также парсеры) на этих данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100,
+                            help='Размер ответа в рецептах.')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        recipes = list(Recipe.objects.select_related('author')
+                       .prefetch_related('tags',
+                                         'recipe_ingredient__ingredient')
+                       [:options['recipes']])
+        if not recipes:
+            raise CommandError('В базе нет рецептов для замера.')
+
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        payload = RecipeSerializer(recipes, many=True,
+                                   context={'request': request}).data
+        # Добиваем до нужного размера копиями реальных рецептов.
+        payload = (payload * (options['recipes'] // len(payload) + 1))[
+            :options['recipes']]
+        data = {'count': len(payload), 'next': None, 'previous': None,
+                'results': payload}
+
+        standard, fast = JSONRenderer(), FastJSONRenderer()
+        body = standard.render(data)
+        if fast.render(data) != body:
+            raise CommandError('Вывод FastJSONRenderer отличается от '
+                               'JSONRenderer.')
+
+        self.stdout.write(f'orjson: {orjson.__version__ if orjson else "нет"}'
+                          f', рецептов: {len(payload)}, '
+                          f'размер ответа: {len(body) / 1024:.1f} КБ')
+        self.report('render', lambda: standard.render(data),
+                    lambda: fast.render(data), options['repeat'])
+        self.report('parse', lambda: JSONParser().parse(io.BytesIO(body)),
+                    lambda: FastJSONParser().parse(io.BytesIO(body)),
+                    options['repeat'])
+
+    def report(self, name, standard, fast, repeat):
+        timings = {}
+        for label, func in (('json', standard), ('fast', fast)):
+            timings[label] = statistics.median(
+                timeit.repeat(func, number=1, repeat=repeat)) * 1000
+        self.stdout.write(
+            f'{name:>7}: json {timings["json"]:7.2f} мс, '
+            f'fast {timings["fast"]:7.2f} мс, '
+            f'ускорение x{timings["json"] / timings["fast"]:.1f}')
@@ -0,0 +1,79 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+PROBE = '''
+import json
+import sys
+import time
+from io import BytesIO
+
+started = time.perf_counter()
+# Как в gunicorn.conf.py.
+from backend.startup import skip_optional_modules
+skip_optional_modules()
+from backend.wsgi import application
+imported = time.perf_counter()
+
+
+def request(url):
+    path, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '8000',
+        'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    statuses = []
+    body = application(environ, lambda status, headers: statuses.append(
+        status))
+    b''.join(body)
+    body.close()
+    return statuses[0]
+
+
+status = request(sys.argv[1])
+first = time.perf_counter()
+request(sys.argv[1])
+second = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'first_request': first - imported,
+    'second_request': second - first,
+    'status': status,
+}))
+'''
+
+
+class Command(BaseCommand):
+    """Замер времени импорта приложения и первого запроса."""
+    help = ('Запускает новые процессы и замеряет время загрузки Django и '
+            'время до первого ответа.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/api/tags/')
+
+    def handle(self, *args, **options):
+        results = []
+        for _ in range(options['runs']):
+            process = subprocess.run(
+                (sys.executable, '-c', PROBE, options['path']),
+                cwd=settings.BASE_DIR, capture_output=True, text=True,
+                check=True)
+            results.append(json.loads(process.stdout.splitlines()[-1]))
+
+        self.stdout.write(f'{options["path"]}: {results[0]["status"]}, '
+                          f'запусков: {len(results)}')
+        for key in ('import', 'first_request', 'second_request'):
+            timings = [result[key] * 1000 for result in results]
+            self.stdout.write(
+                f'{key:>15}: медиана {statistics.median(timings):8.1f} мс, '
+                f'мин {min(timings):8.1f} мс, макс {max(timings):8.1f} мс')
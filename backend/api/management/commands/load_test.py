@@ -0,0 +1,210 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfF'
+         'cSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+# Сценарий: (имя, вес). Вес — доля сценария в потоке запросов.
+SCENARIOS = (
+    ('recipes:list', 35),
+    ('recipes:detail', 15),
+    ('ingredients:list', 15),
+    ('recipes:feed', 8),
+    ('recipes:favorite', 10),
+    ('recipes:shopping_cart', 8),
+    ('recipes:download_shopping_cart', 5),
+    ('recipes:create', 4),
+)
+
+
+class VirtualUser:
+    """Пользователь со своим keep-alive соединением и токеном."""
+
+    def __init__(self, command, token):
+        self.command = command
+        self.rng = random.Random()
+        self.headers = {'Accept': 'application/json',
+                        'Accept-Encoding': 'gzip, br',
+                        'Content-Type': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f'Token {token}'
+        self.connection = None
+
+    def request(self, route, method, path, body=None):
+        if self.connection is None:
+            self.connection = self.command.connect()
+        started = time.perf_counter()
+        try:
+            self.connection.request(
+                method, path, body=body and json.dumps(body),
+                headers=self.headers)
+            response = self.connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            status = 0
+        self.command.record(route, status, time.perf_counter() - started)
+        return status
+
+    def run(self, deadline, think_time):
+        names = [name for name, _ in SCENARIOS]
+        weights = [weight for _, weight in SCENARIOS]
+        while time.monotonic() < deadline:
+            scenario = self.rng.choices(names, weights)[0]
+            getattr(self, scenario.replace(':', '_'))(scenario)
+            if think_time:
+                time.sleep(self.rng.uniform(0, 2 * think_time))
+        if self.connection is not None:
+            self.connection.close()
+
+    def recipe_id(self):
+        return self.rng.choice(self.command.recipe_ids)
+
+    def recipes_list(self, route):
+        params = [('page', self.rng.randint(1, 20)), ('limit', 6)]
+        params += [('tags', slug) for slug in self.rng.sample(
+            self.command.tags, self.rng.randint(0, len(self.command.tags)))]
+        self.request(route, 'GET', f'/api/recipes/?{urlencode(params)}')
+
+    def recipes_detail(self, route):
+        self.request(route, 'GET', f'/api/recipes/{self.recipe_id()}/')
+
+    def ingredients_list(self, route):
+        name = self.rng.choice(self.command.prefixes)
+        for length in range(1, len(name) + 1):
+            self.request(route, 'GET', '/api/ingredients/?' + urlencode(
+                {'name': name[:length]}))
+
+    def recipes_feed(self, route):
+        self.request(route, 'GET', '/api/recipes/feed/')
+
+    def toggle(self, route, action):
+        path = f'/api/recipes/{self.recipe_id()}/{action}/'
+        if self.request(route, 'POST', path) in (201, 400):
+            self.request(route, 'DELETE', path)
+
+    def recipes_favorite(self, route):
+        self.toggle(route, 'favorite')
+
+    def recipes_shopping_cart(self, route):
+        self.toggle(route, 'shopping_cart')
+
+    def recipes_download_shopping_cart(self, route):
+        self.request(route, 'GET', '/api/recipes/download_shopping_cart/')
+
+    def recipes_create(self, route):
+        ingredients = self.rng.sample(self.command.ingredient_ids, 3)
+        self.request(route, 'POST', '/api/recipes/', {
+            'name': 'Рецепт нагрузочного теста',
+            'text': 'Описание.',
+            'cooking_time': self.rng.randint(5, 120),
+            'image': IMAGE,
+            'tags': [self.rng.choice(self.command.tag_ids)],
+            'ingredients': [{'id': pk, 'amount': self.rng.randint(2, 100)}
+                            for pk in ingredients],
+        })
+
+
+class Command(BaseCommand):
+    """Нагрузочное тестирование API смешанным потоком запросов."""
+    help = ('Запускает --users виртуальных пользователей, которые в '
+            'течение --duration секунд отправляют на --url запросы по '
+            'сценариям SCENARIOS, и выводит пропускную способность и '
+            'задержки p50/p95/p99 по каждому сценарию. Токены берутся из '
+            'базы: заполните её командой seed_data.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--duration', type=float, default=60)
+        parser.add_argument('--think-time', type=float, default=0.5,
+                            help='Средняя пауза между действиями, секунд.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.connection_class = (http.client.HTTPSConnection
+                                 if url.scheme == 'https'
+                                 else http.client.HTTPConnection)
+        self.netloc, self.timeout = url.netloc, options['timeout']
+        self.load_data(options['users'])
+
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        users = [VirtualUser(self, token) for token in self.tokens]
+        deadline = time.monotonic() + options['duration']
+        threads = [threading.Thread(target=user.run, daemon=True,
+                                    args=(deadline, options['think_time']))
+                   for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report(time.perf_counter() - started)
+
+    def load_data(self, users):
+        self.tokens = list(Token.objects.order_by('?').values_list(
+            'key', flat=True)[:users])
+        if len(self.tokens) < users:
+            raise CommandError(f'В базе {len(self.tokens)} токенов, нужно '
+                               f'{users}: выполните seed_data.')
+        self.recipe_ids = list(Recipe.objects.order_by('?').values_list(
+            'id', flat=True)[:1000])
+        self.tags = list(Tag.objects.values_list('slug', flat=True))
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredients = list(Ingredient.objects.order_by('?').values_list(
+            'id', 'name')[:1000])
+        if not self.recipe_ids or not self.tags or not ingredients:
+            raise CommandError('Нет рецептов, тегов или ингредиентов: '
+                               'выполните import_data и seed_data.')
+        self.ingredient_ids = [pk for pk, _ in ingredients]
+        self.prefixes = [name[:4] for _, name in ingredients]
+
+    def connect(self):
+        return self.connection_class(self.netloc, timeout=self.timeout)
+
+    def record(self, route, status, latency):
+        with self.lock:
+            self.latencies[route].append(latency)
+            self.statuses[route][status] += 1
+
+    def report(self, elapsed):
+        total = sum(len(items) for items in self.latencies.values())
+        self.stdout.write(f'Запросов: {total} за {elapsed:.1f} с, '
+                          f'{total / elapsed:.1f} запросов/с')
+        self.stdout.write(f'{"сценарий":<32}{"запросов":>9}{"в с":>8}'
+                          f'{"p50, мс":>9}{"p95, мс":>9}{"p99, мс":>9}'
+                          f'  статусы')
+        for route, _ in SCENARIOS:
+            latencies = self.latencies.get(route)
+            if not latencies:
+                continue
+            if len(latencies) > 1:
+                percentiles = statistics.quantiles(latencies, n=100)
+            else:
+                percentiles = latencies * 99
+            statuses = ' '.join(
+                f'{status}:{count}' for status, count in sorted(
+                    self.statuses[route].items()))
+            self.stdout.write(
+                f'{route:<32}{len(latencies):>9}'
+                f'{len(latencies) / elapsed:>8.1f}'
+                f'{percentiles[49] * 1000:>9.1f}'
+                f'{percentiles[94] * 1000:>9.1f}'
+                f'{percentiles[98] * 1000:>9.1f}  {statuses}')
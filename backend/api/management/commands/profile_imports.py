@@ -0,0 +1,62 @@
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+IMPORT_TIME_LINE = re.compile(
+    r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| '
+    r'(?P<indent>\s*)(?P<module>\S+)$')
+
+TARGETS = {
+    'setup': 'import django; django.setup()',
+    'urls': f'import django; django.setup(); '
+            f'import {settings.ROOT_URLCONF}',
+    'wsgi': 'from backend.wsgi import application',
+}
+
+
+class Command(BaseCommand):
+    """Профилирование импортов при старте приложения."""
+    help = ('Запускает новый процесс с python -X importtime и выводит '
+            'самые дорогие модули и пакеты.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=TARGETS, default='urls')
+        parser.add_argument('--limit', type=int, default=25)
+
+    def handle(self, *args, **options):
+        process = subprocess.run(
+            (sys.executable, '-X', 'importtime', '-c',
+             TARGETS[options['target']]),
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True)
+
+        modules = []
+        packages = defaultdict(int)
+        for line in process.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match is None:
+                continue
+            own = int(match['self'])
+            modules.append((int(match['cumulative']), own,
+                            len(match['indent']) // 2, match['module']))
+            packages[match['module'].split('.')[0]] += own
+
+        total = sum(packages.values())
+        self.stdout.write(f'Всего на импорты: {total / 1000:.1f} мс, '
+                          f'модулей: {len(modules)}')
+
+        self.stdout.write('\nМодули по накопленному времени, мс:')
+        modules.sort(reverse=True)
+        for cumulative, own, depth, module in modules[:options['limit']]:
+            self.stdout.write(f'{cumulative / 1000:9.1f} {own / 1000:8.1f}  '
+                              f'{"  " * depth}{module}')
+
+        self.stdout.write('\nПакеты по собственному времени, мс:')
+        ranking = sorted(packages.items(), key=lambda item: -item[1])
+        for package, own in ranking[:options['limit']]:
+            self.stdout.write(f'{own / 1000:9.1f}  {package}')
@@ -0,0 +1,116 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import combinations
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import RequestFactory
+
+from api.cache import get_tag_ids_by_slug, warm_reference_cache
+from api.paginations import PageRequiredPagination
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+
+WARMED = 'прогрето'
+FAILED = 'ошибка'
+SKIPPED = 'пропущено'
+
+# Виды задач в порядке вывода в отчёте.
+KINDS = ('справочники', 'страницы рецептов', 'рецепты')
+
+
+class Command(BaseCommand):
+    """Прогрев кешей после деплоя."""
+    help = ('Заполняет кеш справочников, первые --pages страниц списка '
+            'рецептов для анонимных пользователей по каждому сочетанию '
+            'тегов и --top-recipes самых популярных рецептов. Работа '
+            'выполняется в --workers потоках; задачи, не начатые за '
+            '--time-budget секунд, пропускаются.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=settings.CACHE_WARM_URL,
+                            help='Адрес сайта: ссылки в ответах абсолютные.')
+        parser.add_argument('--pages', type=int, default=3)
+        parser.add_argument('--limit', type=int,
+                            default=PageRequiredPagination.page_size,
+                            help='Рецептов на странице.')
+        parser.add_argument('--max-tags', type=int, default=3,
+                            help='Наибольшее число тегов в сочетании.')
+        parser.add_argument('--top-recipes', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--time-budget', type=float, default=60,
+                            help='Ограничение времени прогрева, секунд.')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.factory = RequestFactory(HTTP_HOST=url.netloc)
+        self.secure = url.scheme == 'https'
+        self.list_view = RecipeViewSet.as_view({'get': 'list'})
+        self.detail_view = RecipeViewSet.as_view({'get': 'retrieve'})
+
+        started = time.monotonic()
+        deadline = started + options['time_budget']
+        with ThreadPoolExecutor(options['workers']) as executor:
+            futures = [(kind, executor.submit(self.run_task, task, deadline))
+                       for kind, task in self.get_tasks(options)]
+        results = defaultdict(lambda: defaultdict(int))
+        for kind, future in futures:
+            results[kind][future.result()] += 1
+        self.report(results, time.monotonic() - started)
+
+    def get_tasks(self, options):
+        """Задачи прогрева в порядке важности: (вид, функция)."""
+        yield KINDS[0], warm_reference_cache
+
+        slugs = sorted(get_tag_ids_by_slug())
+        tag_sets = [tags for size in range(min(options['max_tags'],
+                                               len(slugs)) + 1)
+                    for tags in combinations(slugs, size)]
+        for page in range(1, options['pages'] + 1):
+            for tags in tag_sets:
+                params = [('page', page), ('limit', options['limit'])]
+                params += [('tags', slug) for slug in tags]
+                yield KINDS[1], partial(self.get, self.list_view,
+                                        '/api/recipes/', params)
+
+        recipe_ids = Recipe.objects.filter(is_active=True).annotate(
+            favorites_count=Count('favorite')).order_by(
+            '-favorites_count', '-id').values_list(
+            'id', flat=True)[:options['top_recipes']]
+        for pk in recipe_ids:
+            # Аргументы вьюхи — строки, как после разбора URL.
+            yield KINDS[2], partial(self.get, self.detail_view,
+                                    f'/api/recipes/{pk}/', pk=str(pk))
+
+    def get(self, view, path, params=(), **kwargs):
+        """Анонимный запрос к вьюсету: ответ сохраняется в его кеше."""
+        response = view(self.factory.get(path, params, secure=self.secure),
+                        **kwargs)
+        if response.status_code != 200:
+            raise ValueError(f'{path}: статус {response.status_code}')
+
+    def run_task(self, task, deadline):
+        """Задачи, не начатые до deadline, пропускаются."""
+        if time.monotonic() > deadline:
+            return SKIPPED
+        try:
+            task()
+        except Exception as error:
+            self.stderr.write(f'Ошибка прогрева: {error!r}')
+            return FAILED
+        finally:
+            connections.close_all()
+        return WARMED
+
+    def report(self, results, elapsed):
+        for kind in KINDS:
+            counts = ', '.join(f'{status}: {count}' for status, count in
+                               sorted(results[kind].items()))
+            self.stdout.write(f'{kind}: {counts or "нет задач"}')
+        self.stdout.write(f'Прогрев занял {elapsed:.1f} с')
@@ -0,0 +1,60 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+def compress_brotli_sequence(sequence):
+    compressor = brotli.Compressor(quality=settings.BROTLI_QUALITY)
+    for item in sequence:
+        # flush() отдаёт клиенту каждый кусок, не дожидаясь конца потока.
+        yield compressor.process(item) + compressor.flush()
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов API: brotli, если доступен, иначе gzip.
+
+    Сжимаются только ответы по путям COMPRESSION_PATH_PREFIXES размером
+    от COMPRESSION_MIN_LENGTH байт и все потоковые ответы.
+    """
+
+    def process_response(self, request, response):
+        if not request.path.startswith(settings.COMPRESSION_PATH_PREFIXES):
+            return response
+        if not response.streaming and (
+                len(response.content) < settings.COMPRESSION_MIN_LENGTH):
+            return response
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = compress_brotli_sequence(
+                response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content,
+                                         quality=settings.BROTLI_QUALITY)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -1,8 +1,50 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class PageRequiredPagination(PageNumberPagination):
     """Кастомный пагинатор."""
     page_size = 6
     page_size_query_param = 'limit'
-    
\ No newline at end of file
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу: следующая страница начинается после последнего
+    id предыдущей, без OFFSET и COUNT."""
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'before'
+    
+    def paginate_keys(self, fetch, request):
+        """fetch(before, limit) возвращает ключи по убыванию."""
+        self.request = request
+        limit = self.get_page_size(request)
+        try:
+            before = _positive_int(
+                request.query_params[self.cursor_query_param])
+        except (KeyError, ValueError):
+            before = None
+        
+        keys = fetch(before, limit + 1)
+        self.next_key = keys[limit - 1] if len(keys) > limit else None
+        return keys[:limit]
+    
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+    
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, self.next_key)
+    
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
@@ -0,0 +1,36 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson and (orjson.OPT_NON_STR_KEYS
+                             | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson с откатом на стандартный json.
+
+    Типы, которые orjson не сериализует сам (Decimal, ленивые строки
+    перевода, datetime, QuerySet), передаются в энкодер DRF, поэтому
+    вывод совпадает с JSONRenderer побайтно. Отступы (браузерный API)
+    и нестрогий режим по-прежнему обрабатывает JSONRenderer.
+    """
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact
+                or self.ensure_ascii or not self.strict
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder.default,
+                           option=ORJSON_OPTIONS)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+                b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -1,16 +1,49 @@
 from django.core.validators import MinValueValidator
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import exceptions, serializers
 from rest_framework.fields import SerializerMethodField
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework.settings import api_settings
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from recipes.services import add_recipe, refresh_cart_totals
 from users.models import Follow, User
 
 
+def requested_fields(request, available):
+    """Поля ответа по параметрам ?fields= и ?omit= (имена через запятую)."""
+    selected = set(available)
+    for param in ('fields', 'omit'):
+        value = request.query_params.get(param)
+        if not value:
+            continue
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names.difference(available)
+        if unknown:
+            raise exceptions.ValidationError(
+                {param: [f'Неизвестные поля: {", ".join(sorted(unknown))}.']})
+        if param == 'fields':
+            selected &= names
+        else:
+            selected -= names
+    return tuple(name for name in available if name in selected)
+
+
+class SparseFieldsMixin:
+    """Миксин для выбора полей ответа параметрами ?fields= и ?omit=."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or not hasattr(request, 'query_params'):
+            return
+        selected = requested_fields(request, tuple(self.fields))
+        for name in tuple(self.fields):
+            if name not in selected:
+                self.fields.pop(name)
+
+
 class GetSubscribedMixin:
     """Миксин для отображения информации о подписках"""
     def get_is_subscribed(self, object):
@@ -47,9 +80,10 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
         
         
-class FollowSerializer(serializers.ModelSerializer, GetSubscribedMixin):
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer,
+                       GetSubscribedMixin):
     """Сериализатор для подписок."""
-    recipes = ShortRecipeSerializer(read_only=True, many=True)
+    recipes = SerializerMethodField(read_only=True)
     recipes_count = SerializerMethodField(read_only=True)
     is_subscribed = SerializerMethodField(read_only=True)
     
@@ -61,8 +95,12 @@ class FollowSerializer(serializers.ModelSerializer, GetSubscribedMixin):
             'email', 'id', 'username', 'first_name', 'last_name',
             'is_subscribed', 'recipes', 'recipes_count')
     
+    def get_recipes(self, object):
+        return ShortRecipeSerializer(object.recipes.filter(is_active=True),
+                                     many=True, context=self.context).data
+    
     def get_recipes_count(self, object):
-        return object.recipes.count()
+        return object.recipes.filter(is_active=True).count()
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -93,11 +131,11 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор отображения информации о рецепте."""
     author = UserInfoSerializer(read_only=True)
     tags = TagSerializer(many=True)
-    image = Base64ImageField()
+    image = serializers.ImageField()
     ingredients = RecipeIngredientsSerializer(source='recipe_ingredient',
                                               many=True)
     is_favorited = serializers.SerializerMethodField(
@@ -134,7 +172,6 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     tags = serializers.SlugRelatedField(slug_field='id',
                                         queryset=Tag.objects.all(), many=True)
     ingredients = serializers.ListField()
-    image = Base64ImageField()
     cooking_time = serializers.IntegerField(
         validators=(MinValueValidator(1, message='Время приготовления не'
                                                  'может быть'
@@ -145,6 +182,15 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time', 'ingredients',
                   'tags', 'text', 'author')
     
+    def get_fields(self):
+        # drf_extra_fields загружается только при записи рецепта, а не при
+        # импорте URLconf.
+        from drf_extra_fields.fields import Base64ImageField
+        
+        fields = super().get_fields()
+        fields['image'] = Base64ImageField()
+        return fields
+    
     def validate_ingredients(self, data):
         if not data:
             raise exceptions.ValidationError(
@@ -189,9 +235,10 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             instance.tags.set(tags)
         
         if ingredients:
-            instance.ingredients.clear()
-            RecipeCreateUpdateSerializer.recipe_amount_ingredients_write(
-                instance, ingredients)
+            with refresh_cart_totals(instance):
+                instance.ingredients.clear()
+                RecipeCreateUpdateSerializer.recipe_amount_ingredients_write(
+                    instance, ingredients)
         
         instance.save()
         return instance
@@ -204,15 +251,23 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор добавления/удаления рецепта в избранное."""
+    unique_error_message = 'Рецепт уже добавлен в избранное'
     
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
-        
-        validators = [UniqueTogetherValidator(queryset=Favorite.objects.all(),
-                                              fields=('user', 'recipe'),
-                                              message='Рецепт уже добавлен в '
-                                                      'избранное')]
+        validators = []
+    
+    def create(self, validated_data):
+        # Уникальность проверяет UniqueConstraint в базе: без отдельного
+        # SELECT и без гонки между проверкой и вставкой.
+        try:
+            return add_recipe(self.Meta.model, validated_data['user'],
+                              validated_data['recipe'])
+        except IntegrityError:
+            raise exceptions.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    self.unique_error_message]})
     
     def to_representation(self, instance):
         context = {'request': self.context.get('request')}
@@ -221,12 +276,26 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
 class ShoppingCartSerializer(FavoriteSerializer):
     """Сериализатор списка покупок."""
+    unique_error_message = 'Рецепт уже есть в списке покупок'
     
     class Meta(FavoriteSerializer.Meta):
         model = ShoppingCart
-        validators = [
-            UniqueTogetherValidator(queryset=ShoppingCart.objects.all(),
-                                    fields=('user', 'recipe'),
-                                    message='Рецепт уже есть в '
-                                            'списке покупок')]
- 
\ No newline at end of file
+
+
+class ShoppingCartIngredientSerializer(serializers.ModelSerializer):
+    """Сериализатор итогов списка покупок."""
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+    
+    class Meta:
+        model = ShoppingCartIngredient
+        fields = ('id', 'name', 'measurement_unit', 'amount', 'recipe_count')
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id для пакетных операций."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=100)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Tag
+from users.models import User
+from .authentication import invalidate_token, invalidate_user_tokens
+from .cache import invalidate_ingredients, invalidate_tags
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def reset_tags_cache(**kwargs):
+    invalidate_tags()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_ingredients_cache(**kwargs):
+    invalidate_ingredients()
+
+
+@receiver(post_delete, sender=Token)
+def reset_token_cache(instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def reset_user_tokens_cache(instance, **kwargs):
+    invalidate_user_tokens(instance.id)
@@ -0,0 +1,332 @@
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import (ChangeLog, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Follow, User
+from .authentication import CachedTokenAuthentication, invalidate_user_tokens
+from .fast_serializers import (recipe_columns, serialize_follows,
+                               serialize_recipes, serialize_users,
+                               user_columns)
+from .serializers import FollowSerializer, RecipeSerializer, UserInfoSerializer
+
+TAGS = (('Завтрак', '#E26C2D', 'breakfast'),
+        ('Обед', '#49B64E', 'lunch'),
+        ('Ужин', '#8775D2', 'dinner'))
+
+
+def create_recipes(authors, tags, ingredients, count):
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            name=f'Рецепт {number}', text='Описание.',
+            cooking_time=number + 1, author=authors[number % len(authors)],
+            image=f'recipes_media/{number}.png')
+        recipe.tags.set(tags[:number % len(tags) + 1])
+        for ingredient in ingredients[number % 2::2]:
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=ingredient,
+                                            amount=number + 2)
+        recipes.append(recipe)
+    return recipes
+
+
+class FoodgramTestCase(TestCase):
+    """Общие данные тестов: пользователи, теги, ингредиенты и рецепты.
+
+    Рецепт n принадлежит пользователю n % users_count и получает первые
+    n % tags_count + 1 тегов: у многих рецептов их несколько.
+    """
+    users_count = 1
+    tags_count = 1
+    ingredients_count = 2
+    recipes_count = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(
+            username=f'user{number}', email=f'user{number}@example.com',
+            first_name='Имя', last_name=f'Фамилия {number}',
+            password='pass12345!') for number in range(cls.users_count)]
+        cls.user = cls.users[0]
+        cls.tags = [Tag.objects.create(name=name, color=color, slug=slug)
+                    for name, color, slug in TAGS[:cls.tags_count]]
+        cls.ingredients = [Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(cls.ingredients_count)]
+        cls.recipes = create_recipes(cls.users, cls.tags, cls.ingredients,
+                                     cls.recipes_count)
+
+    def setUp(self):
+        # Справочники и страницы кешируются, id в них от других тестов.
+        for cache in caches.all():
+            cache.clear()
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+
+class FastSerializersParityTest(FoodgramTestCase):
+    """Быстрые сериализаторы совпадают с DRF-сериализаторами побайтно."""
+    users_count = 3
+    tags_count = 2
+    ingredients_count = 4
+    recipes_count = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes[-1].is_active = False
+        cls.recipes[-1].save()
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[2])
+        Follow.objects.create(user=cls.user, author=cls.users[1])
+        Follow.objects.create(user=cls.user, author=cls.users[2])
+
+    def get_request(self, user=None, query=None):
+        request = Request(APIRequestFactory().get('/api/', query or {}))
+        if user is not None:
+            request.user = user
+        return request
+
+    def requests(self):
+        return {'аноним': self.get_request(),
+                'пользователь': self.get_request(self.user)}
+
+    def assertSameJSON(self, fast, drf):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(fast), renderer.render(drf))
+
+    def test_recipes(self):
+        recipes = Recipe.objects.filter(is_active=True).order_by('id')
+        for name, request in self.requests().items():
+            with self.subTest(name):
+                self.assertSameJSON(
+                    serialize_recipes(list(recipes.values(*recipe_columns())),
+                                      request),
+                    RecipeSerializer(recipes, many=True,
+                                     context={'request': request}).data)
+
+    def test_recipes_with_selected_fields(self):
+        request = self.get_request(
+            self.user, {'fields': 'id,name,author,is_favorited'})
+        fields = ('id', 'author', 'name', 'is_favorited')
+        recipes = Recipe.objects.filter(is_active=True).order_by('id')
+        self.assertSameJSON(
+            serialize_recipes(list(recipes.values(*recipe_columns(fields))),
+                              request, fields),
+            RecipeSerializer(recipes, many=True,
+                             context={'request': request}).data)
+
+    def test_users(self):
+        users = User.objects.order_by('id')
+        for name, request in self.requests().items():
+            with self.subTest(name):
+                self.assertSameJSON(
+                    serialize_users(list(users.values(*user_columns())),
+                                    request),
+                    UserInfoSerializer(users, many=True,
+                                       context={'request': request}).data)
+
+    def test_follows(self):
+        request = self.get_request(self.user)
+        authors = User.objects.filter(
+            following__user=self.user).order_by('id')
+        self.assertSameJSON(
+            serialize_follows(
+                list(authors.values(*user_columns(
+                    FollowSerializer.Meta.fields))), request),
+            FollowSerializer(authors, many=True,
+                             context={'request': request}).data)
+
+
+class RecipeFilterTest(FoodgramTestCase):
+    """Фильтр по нескольким тегам и пагинация списка рецептов."""
+    tags_count = 3
+    recipes_count = 20
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.get_client(self.user)
+
+    def get_recipes(self, **params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_several_tags_without_duplicates(self):
+        slugs = ['breakfast', 'lunch']
+        expected = {recipe.id for recipe in self.recipes
+                    if recipe.tags.filter(slug__in=slugs).exists()}
+        ids = []
+        data = self.get_recipes(tags=slugs, limit=7)
+        for page in range(2, data['count'] // 7 + 2):
+            ids += [recipe['id'] for recipe in data['results']]
+            data = self.get_recipes(tags=slugs, limit=7, page=page)
+        ids += [recipe['id'] for recipe in data['results']]
+
+        self.assertEqual(data['count'], len(expected))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), expected)
+
+    def test_queries_do_not_depend_on_page(self):
+        slugs = ['lunch', 'dinner']
+        self.get_recipes(tags=slugs, limit=5)
+        for page in (1, 2, 3):
+            with self.subTest(page=page), self.assertNumQueries(8):
+                self.get_recipes(tags=slugs, limit=5, page=page)
+
+
+class RecipeNotFoundTest(FoodgramTestCase):
+    """Неверный или неизвестный id рецепта — 404, а не ошибка сервера."""
+    recipes_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe, cls.hidden = cls.recipes
+        cls.hidden.is_active = False
+        cls.hidden.save()
+
+    def clients(self):
+        return {'аноним': self.get_client(),
+                'пользователь': self.get_client(self.user)}
+
+    def assertNotFound(self, path):
+        for name, client in self.clients().items():
+            with self.subTest(name, path=path):
+                self.assertEqual(client.get(path).status_code, 404)
+
+    def test_recipe(self):
+        self.assertNotFound('/api/recipes/abc/')
+
+    def test_similar(self):
+        for pk in ('abc', self.hidden.pk, self.hidden.pk + 1):
+            self.assertNotFound(f'/api/recipes/{pk}/similar/')
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/similar/')
+        self.assertEqual((response.status_code, response.json()), (200, []))
+
+
+class RecipePageCacheTest(FoodgramTestCase):
+    """Кеш страниц списка рецептов для анонимных пользователей."""
+    recipes_count = 2
+
+    def get_names(self, client):
+        response = client.get('/api/recipes/')
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_change_invalidates_page(self):
+        client = self.get_client()
+        names = self.get_names(client)
+        # Из кеша: только запрос версии данных.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_names(client), names)
+
+        recipe = self.recipes[0]
+        recipe.name = 'Новое название'
+        recipe.save()
+        self.assertIn('Новое название', self.get_names(client))
+
+
+@override_settings(SYNC_LAG_SECONDS=0)
+class SyncTest(FoodgramTestCase):
+    """Журнал изменений и /api/sync/."""
+    recipes_count = 5
+
+    def recipe_changes(self):
+        return ChangeLog.objects.filter(kind=ChangeLog.RECIPE).count()
+
+    def test_pages_cover_all_changes(self):
+        token, recipe_ids = '0', set()
+        while True:
+            data = self.client.get('/api/sync/',
+                                   {'since': token, 'limit': 3}).json()
+            recipe_ids.update(recipe['id'] for recipe in data['recipes'])
+            token = data['next']
+            if not data['has_more']:
+                break
+        self.assertEqual(recipe_ids, {recipe.id for recipe in self.recipes})
+        data = self.client.get('/api/sync/', {'since': token}).json()
+        self.assertEqual((data['next'], data['recipes']), (token, []))
+
+    def test_invalid_token(self):
+        response = self.client.get('/api/sync/', {'since': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_author_change_touches_recipes(self):
+        before = self.recipe_changes()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=('last_login',))
+            self.user.save()
+        self.assertEqual(self.recipe_changes(), before)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Новое имя'
+            self.user.save()
+        self.assertEqual(self.recipe_changes(), before + len(self.recipes))
+
+
+@mock.patch('api.authentication.is_shared_cache', return_value=True)
+class CachedTokenAuthenticationTest(FoodgramTestCase):
+    """Кеш токенов и его сброс."""
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self, queries):
+        with self.assertNumQueries(queries):
+            user, _ = self.authentication.authenticate_credentials(
+                self.token.key)
+        return user
+
+    def test_cache_hit(self, shared_cache):
+        self.assertEqual(self.authenticate(1), self.user)
+        user = self.authenticate(0)
+        self.assertEqual((user.pk, user.is_active), (self.user.pk, True))
+        self.assertEqual(user.username, self.user.username)
+
+    def test_logout(self, shared_cache):
+        self.authenticate(1)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_deactivation(self, shared_cache):
+        self.authenticate(1)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_deactivation_by_update(self, shared_cache):
+        self.authenticate(1)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_user_tokens(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_password_change(self, shared_cache):
+        self.authenticate(1)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.post('/api/users/set_password/', {
+            'current_password': 'pass12345!',
+            'new_password': 'new-pass12345!'})
+        self.assertEqual(response.status_code, 204)
+        # Снимок сброшен: токен снова проверяется по базе.
+        self.authenticate(1)
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import ScopedRateThrottle
+
+
+class ActionThrottleScopeMixin:
+    """Scope ограничения частоты по действию вьюсета (throttle_scopes)."""
+    throttle_scopes = {}
+
+    @property
+    def throttle_scope(self):
+        return self.throttle_scopes.get(self.action)
+
+
+class SlidingWindowThrottle(ScopedRateThrottle):
+    """Ограничение частоты запросов по скользящему окну.
+
+    Хранит в кеше два счётчика: для текущего и предыдущего фиксированного
+    окна. Число запросов за последние duration секунд оценивается как
+    счётчик текущего окна плюс непрошедшая доля предыдущего. Счётчики
+    увеличиваются атомарным incr, поэтому решение принимается без
+    обращений к базе и одинаково работает с общим (memcached) и локальным
+    (locmem) бэкендом кеша.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window, position = divmod(self.now, self.duration)
+        self.elapsed = position / self.duration
+        current_key = f'{self.key}_{int(window)}'
+        previous_key = f'{self.key}_{int(window) - 1}'
+
+        counters = self.cache.get_many((previous_key, current_key))
+        self.previous = counters.get(previous_key, 0)
+        self.current = counters.get(current_key, 0)
+        if self.estimate() >= self.num_requests:
+            return self.throttle_failure()
+
+        if not self.cache.add(current_key, 1, self.duration * 2):
+            try:
+                self.current = self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def estimate(self):
+        return self.previous * (1 - self.elapsed) + self.current
+
+    def wait(self):
+        if self.current >= self.num_requests:
+            # После смены окна текущий счётчик станет предыдущим.
+            tail = max(0, 1 - self.num_requests / self.current)
+            return (1 - self.elapsed + tail) * self.duration
+        if not self.previous:
+            return None
+        share = 1 - (self.num_requests - self.current) / self.previous
+        return max(0, share - self.elapsed) * self.duration
+
+
+class UserScopedThrottle(SlidingWindowThrottle):
+    """Лимит на пользователя (для анонимов — на IP) в рамках scope."""
+    cache_format = 'throttle_user_%(scope)s_%(ident)s'
+
+
+class IPScopedThrottle(SlidingWindowThrottle):
+    """Лимит на IP-адрес в рамках scope, общий для всех пользователей."""
+    cache_format = 'throttle_ip_%(scope)s_%(ident)s'
+
+    def get_rate(self):
+        self.scope = f'{self.scope}_ip'
+        return super().get_rate()
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
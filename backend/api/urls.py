@@ -2,7 +2,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from .views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                    TagViewSet)
+                    SyncViewSet, TagViewSet)
 
 app_name = 'api'
 
@@ -11,6 +11,7 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', CustomUserViewSet, basename='users')
+router.register('sync', SyncViewSet, basename='sync')
 
 urlpatterns = (
     path('', include(router.urls)),
@@ -1,57 +1,119 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import hashlib
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from djoser.utils import logout_user
 from djoser.views import UserViewSet
 
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import _positive_int
 from rest_framework.permissions import AllowAny, IsAuthenticated, SAFE_METHODS
 from rest_framework.response import Response
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.deletion import schedule_recipe_deletion, schedule_user_deletion
+from recipes.models import (ChangeLog, Favorite, Ingredient, Recipe,
+                            ShoppingCart, SimilarRecipe, Tag)
+from recipes.services import (add_recipes, add_subscriptions, backfill_feed,
+                              clear_recipes, get_changes, get_feed,
+                              publish_to_feeds, remove_recipe, remove_recipes,
+                              remove_subscriptions, trim_feed)
 from users.models import Follow, User
+from .cache import (get_ingredients, get_tags, recipe_detail_cache_key,
+                    recipe_page_cache_key)
+from .fast_serializers import (SHORT_RECIPE_FIELDS, recipe_columns,
+                               serialize_follows, serialize_recipes,
+                               serialize_short_recipes, serialize_users,
+                               user_columns)
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import PageRequiredPagination
+from .paginations import KeysetPagination, PageRequiredPagination
 from .permissions import IsAuthorOrAdminOrReadOnly
-from .serializers import (FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeCreateUpdateSerializer,
-                          RecipeSerializer, ShoppingCartSerializer,
-                          TagSerializer, UserInfoSerializer)
+from .serializers import (BulkIdsSerializer, FavoriteSerializer,
+                          FollowSerializer, IngredientSerializer,
+                          RecipeCreateUpdateSerializer, RecipeSerializer,
+                          ShoppingCartIngredientSerializer,
+                          ShoppingCartSerializer, TagSerializer,
+                          UserInfoSerializer, requested_fields)
+from .throttles import ActionThrottleScopeMixin
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ActionThrottleScopeMixin, UserViewSet):
     """Вьюсет пользователей."""
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_active=True).order_by('id')
     serializer_class = UserInfoSerializer
     pagination_class = PageRequiredPagination
+    throttle_scopes = {'subscribe': 'toggle', 'subscribe_bulk': 'toggle'}
     
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, **kwargs):
         author_id = self.kwargs.get('id')
-        author = get_object_or_404(User, id=author_id)
+        author = get_object_or_404(User, id=author_id, is_active=True)
         
         if request.method == 'POST':
-            serializer = FollowSerializer(author, data=request.data,
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=request.user, author=author)
+                    backfill_feed(request.user, (author.id,))
+            except IntegrityError:
+                return Response({'error': 'Вы уже подписаны на этого '
+                                          'автора'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            serializer = FollowSerializer(author,
                                           context={"request": request})
-            serializer.is_valid(raise_exception=True)
-            Follow.objects.create(user=request.user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         if request.method == 'DELETE':
-            subscription = get_object_or_404(Follow, user=request.user, author=author)
-            subscription.delete()
+            deleted, _ = Follow.objects.filter(user=request.user,
+                                               author=author).delete()
+            if not deleted:
+                raise Http404
+            trim_feed(request.user, (author.id,))
             return Response(status=status.HTTP_204_NO_CONTENT)
     
+    def perform_destroy(self, instance):
+        if instance == self.request.user:
+            logout_user(self.request)
+        schedule_user_deletion(instance)
+    
+    @action(detail=False, methods=['post', 'delete'], url_path='subscribe',
+            permission_classes=[IsAuthenticated])
+    def subscribe_bulk(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        
+        if request.method == 'POST':
+            results = add_subscriptions(request.user, ids)
+        else:
+            results = remove_subscriptions(request.user, ids)
+        return Response({'results': results})
+    
+    def list(self, request, *args, **kwargs):
+        pages = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()).values(*user_columns()))
+        return self.get_paginated_response(serialize_users(pages, request))
+    
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
-        pages = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(pages, many=True,
-                                      context={'request': request})
-        return self.get_paginated_response(serializer.data)
+        queryset = User.objects.filter(
+            following__user=request.user, is_active=True).order_by('id')
+        fields = requested_fields(request, FollowSerializer.Meta.fields)
+        pages = self.paginate_queryset(
+            queryset.values(*user_columns(fields)))
+        return self.get_paginated_response(
+            serialize_follows(pages, request, fields))
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -60,39 +122,185 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    
+    def list(self, request, *args, **kwargs):
+        return Response(get_tags())
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Получение ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    # list() не использует фильтр: отбор по ?name= повторён ниже по
+    # закешированному списку. Фильтр оставлен для схемы API (параметр
+    # name) и для retrieve.
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     permission_classes = (AllowAny,)
     pagination_class = None
+    
+    def list(self, request, *args, **kwargs):
+        """Отбор как в IngredientFilter: по началу name, без учёта регистра."""
+        ingredients = get_ingredients()
+        name = request.query_params.get('name')
+        if name:
+            name = name.lower()
+            ingredients = [ingredient for ingredient in ingredients
+                           if ingredient['name'].lower().startswith(name)]
+        return Response(ingredients)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ActionThrottleScopeMixin, viewsets.ModelViewSet):
     """Вьюсет рецептов."""
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.filter(is_active=True)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     pagination_class = PageRequiredPagination
+    throttle_scopes = {
+        'create': 'recipe_create',
+        'favorite': 'toggle',
+        'shopping_cart': 'toggle',
+        'favorite_bulk': 'toggle',
+        'shopping_cart_bulk': 'toggle',
+        'clear_shopping_cart': 'toggle',
+        'download_shopping_cart': 'shopping_list',
+    }
+    
+    def get_response_fields(self):
+        return requested_fields(self.request, RecipeSerializer.Meta.fields)
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'retrieve':
+            return queryset
+        fields = self.get_response_fields()
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(
+                'recipe_ingredient__ingredient')
+        return queryset.only(*recipe_columns(fields))
+    
+    def get_recipe_validators(self):
+        """ETag и Last-Modified рецепта без его сериализации.
+
+        ETag строится из времени изменения рецепта, флагов текущего
+        пользователя и формата ответа. Last-Modified отдаётся только
+        анонимам: для пользователя ответ меняется и без изменения рецепта.
+        """
+        try:
+            pk = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+        user = self.request.user
+        recipes = Recipe.objects.filter(pk=pk, is_active=True)
+        flags = ()
+        if user.is_authenticated:
+            flags = ('is_favorited', 'is_in_shopping_cart', 'is_subscribed')
+            recipes = recipes.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_subscribed=Exists(Follow.objects.filter(
+                    user=user, author=OuterRef('author'))))
+        state = recipes.values('updated', *flags).first()
+        if state is None:
+            return None, None
+        parts = (self.kwargs['pk'], state['updated'].isoformat(), user.pk,
+                 *(state[flag] for flag in flags),
+                 self.request.accepted_media_type,
+                 self.get_response_fields())
+        etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+        last_modified = None
+        if user.is_anonymous:
+            last_modified = int(state['updated'].timestamp())
+        return etag, last_modified
+    
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = self.get_recipe_validators()
+        if etag is not None:
+            response = get_conditional_response(
+                request._request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+        if etag is not None and request.user.is_anonymous:
+            response = self.get_cached_response(
+                recipe_detail_cache_key(request, etag),
+                partial(super().retrieve, request, *args, **kwargs))
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        if etag is not None:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
     
     def get_serializer_class(self):
-        if self.request.method in SAFE_METHODS:
+        # request отсутствует при генерации схемы (generateschema).
+        if self.request is None or self.request.method in SAFE_METHODS:
             return RecipeSerializer
         return RecipeCreateUpdateSerializer
     
     def perform_create(self, serializer):
         
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        publish_to_feeds(recipe)
+    
+    def perform_destroy(self, instance):
+        schedule_recipe_deletion(instance)
+    
+    def get_cached_response(self, key, get_response):
+        """Ответ с данными из кеша по key, при промахе — get_response(),
+        данные которого сохраняются в кеш."""
+        data = cache.get(key)
+        if data is None:
+            response = get_response()
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+            return response
+        return Response(data)
+    
+    def list(self, request, *args, **kwargs):
+        if request.user.is_anonymous:
+            return self.get_cached_response(
+                recipe_page_cache_key(request), self.get_recipe_page)
+        return self.get_recipe_page()
+    
+    def get_recipe_page(self):
+        fields = self.get_response_fields()
+        pages = self.paginate_queryset(self.filter_queryset(
+            self.get_queryset()).values(*recipe_columns(fields)))
+        return self.get_paginated_response(
+            serialize_recipes(pages, self.request, fields))
+    
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        paginator = KeysetPagination()
+        recipe_ids = paginator.paginate_keys(
+            lambda before, limit: get_feed(request.user, before, limit),
+            request)
+        fields = self.get_response_fields()
+        recipes = {row['id']: row for row in Recipe.objects.filter(
+            id__in=recipe_ids, is_active=True).values(*recipe_columns(fields))}
+        return paginator.get_paginated_response(serialize_recipes(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], request,
+            fields))
+    
+    @action(detail=True, permission_classes=[AllowAny])
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk, is_active=True)
+        rows = SimilarRecipe.objects.filter(
+            recipe=recipe, similar__is_active=True).order_by(
+            '-score').values_list('similar_id', 'similar__name',
+                                  'similar__image', 'similar__cooking_time')
+        return Response(serialize_short_recipes(
+            [dict(zip(SHORT_RECIPE_FIELDS, row)) for row in rows], request))
     
     def action_post_delete(self, pk, serializer_class):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        item = serializer_class.Meta.model.objects.filter(user=self.request.user,
-                                                          recipe=recipe)
+        recipe = get_object_or_404(Recipe, pk=pk, is_active=True)
         
         if self.request.method == 'POST':
             serializer = serializer_class(data={'user': self.request.user.id, 'recipe': pk},
@@ -102,8 +310,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         if self.request.method == 'DELETE':
-            if item.exists():
-                item.delete()
+            if remove_recipe(serializer_class.Meta.model, self.request.user,
+                             recipe.id):
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response({'error': 'Рецепт отсутствует в списке или '
                                       'удален'},
@@ -117,28 +325,137 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk):
         return self.action_post_delete(pk, ShoppingCartSerializer)
     
+    def bulk_post_delete(self, model):
+        serializer = BulkIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        
+        if self.request.method == 'POST':
+            results = add_recipes(model, self.request.user, ids)
+        else:
+            results = remove_recipes(model, self.request.user, ids)
+        return Response({'results': results})
+    
+    @action(methods=['POST', 'DELETE'], detail=False, url_path='favorite')
+    def favorite_bulk(self, request):
+        return self.bulk_post_delete(Favorite)
+    
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart')
+    def shopping_cart_bulk(self, request):
+        return self.bulk_post_delete(ShoppingCart)
+    
+    @action(methods=['DELETE'], detail=False, url_path='shopping_cart/clear')
+    def clear_shopping_cart(self, request):
+        return Response(
+            {'results': clear_recipes(ShoppingCart, request.user)})
+    
+    @action(detail=False, url_path='shopping_cart/summary',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        serializer = ShoppingCartIngredientSerializer(
+            self.get_cart_ingredients(), many=True)
+        return Response(serializer.data)
+    
+    def get_cart_ingredients(self):
+        return self.request.user.shopping_cart_ingredients.select_related(
+            'ingredient').order_by('ingredient__name')
+    
+    def shopping_list_lines(self, ingredients, chunk_size=500):
+        lines = ['Список покупок:\n\n']
+        for number, item in enumerate(
+                ingredients.iterator(chunk_size=chunk_size), start=1):
+            lines.append(f'{number}) '
+                         f'{item.ingredient.name} - '
+                         f'{item.amount} '
+                         f'{item.ingredient.measurement_unit}\n')
+            if len(lines) >= chunk_size:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+    
     @action(detail=False)
     def download_shopping_cart(self, request):
-        title = 'recipe__ingredients__name'
-        measurement = 'recipe__ingredients__measurement_unit'
-        quantity = 'recipe__recipe_ingredient__amount'
+        ingredients = self.get_cart_ingredients()
         
-        ingredients = request.user.shopping_cart.select_related(
-            'recipe').order_by(title).values(title, measurement).annotate(
-            amount=Sum(quantity)).all()
-        
-        if not ingredients:
+        if not ingredients.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
         
-        text = 'Список покупок:\n\n'
-        for number, ingredient in enumerate(ingredients, start=1):
-            amount = ingredient['amount']
-            text += (f'{number}) '
-                     f'{ingredient[title]} - '
-                     f'{amount} '
-                     f'{ingredient[measurement]}\n')
-        
-        response = HttpResponse(text, content_type='text/plain')
+        response = StreamingHttpResponse(
+            self.shopping_list_lines(ingredients), content_type='text/plain')
         filename = 'shopping_list.txt'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """Изменения рецептов, тегов и ингредиентов после токена ?since=.
+    
+    Токен — позиция txid-id записи ChangeLog (см. её описание), начальный
+    токен — 0. Ответ содержит текущее состояние
+    изменённых объектов (или их id в deleted) и токен next для следующего
+    запроса; has_more означает, что изменения ещё остались. Поля,
+    зависящие от пользователя (избранное, список покупок, подписка),
+    не возвращаются: их изменения в журнал не попадают.
+    """
+    permission_classes = (AllowAny,)
+    recipe_fields = tuple(
+        name for name in RecipeSerializer.Meta.fields
+        if name not in ('is_favorited', 'is_in_shopping_cart'))
+    author_fields = tuple(name for name in UserInfoSerializer.Meta.fields
+                          if name != 'is_subscribed')
+    
+    def get_since(self, request):
+        """Позиция (txid, id) из токена ?since=."""
+        since = request.query_params.get('since', '0')
+        try:
+            if since == '0':
+                return 0, 0
+            txid, pk = since.split('-')
+            return _positive_int(txid), _positive_int(pk)
+        except ValueError:
+            raise ValidationError(
+                {'since': ['Неверный токен синхронизации.']})
+    
+    def get_limit(self, request):
+        try:
+            return _positive_int(request.query_params['limit'], strict=True,
+                                 cutoff=settings.SYNC_MAX_PAGE_SIZE)
+        except (KeyError, ValueError):
+            return settings.SYNC_PAGE_SIZE
+    
+    def list(self, request):
+        since, limit = self.get_since(request), self.get_limit(request)
+        changes = list(get_changes(*since).values_list(
+            'txid', 'id', 'kind', 'object_id')[:limit + 1])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        changed = defaultdict(set)
+        for _, _, kind, object_id in changes:
+            changed[kind].add(object_id)
+        
+        recipes = serialize_recipes(
+            Recipe.objects.filter(
+                id__in=changed[ChangeLog.RECIPE], is_active=True).order_by(
+                'id').values(*recipe_columns(self.recipe_fields)),
+            request, self.recipe_fields, self.author_fields)
+        tags = list(Tag.objects.filter(
+            id__in=changed[ChangeLog.TAG]).order_by('id').values(
+            'id', 'name', 'color', 'slug'))
+        ingredients = list(Ingredient.objects.filter(
+            id__in=changed[ChangeLog.INGREDIENT]).order_by('id').values(
+            'id', 'name', 'measurement_unit'))
+        upserts = {ChangeLog.RECIPE: recipes, ChangeLog.TAG: tags,
+                   ChangeLog.INGREDIENT: ingredients}
+        return Response({
+            'next': '{}-{}'.format(*(changes[-1][:2] if changes else since)),
+            'has_more': has_more,
+            'recipes': recipes,
+            'tags': tags,
+            'ingredients': ingredients,
+            'deleted': {
+                f'{kind}s': sorted(changed[kind].difference(
+                    item['id'] for item in upserts[kind]))
+                for kind, _ in ChangeLog.KINDS},
+        })
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,6 +83,38 @@ DATABASES = {
     }
 }
 
+# Кеши должны быть общими для всех воркеров (memcached в
+# infra/docker-compose.yml): в default хранятся токены и справочники, в
+# throttle — счётчики ограничения частоты. LocMemCache по умолчанию — для
+# разработки и тестов, см. api.cache.is_shared_cache и
+# manage.py check --deploy.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    },
+    'throttle': {
+        'BACKEND': os.getenv(
+            'THROTTLE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION',
+                              default='foodgram-throttle'),
+        'KEY_PREFIX': 'throttle',
+    },
+}
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+# Для локального кеша, где сброс при изменении виден одному воркеру.
+LOCAL_REFERENCE_CACHE_TIMEOUT = 30
+# Страницы списка и рецепты для анонимных пользователей
+# (api.cache.recipe_page_cache_key, recipe_detail_cache_key).
+RECIPE_CACHE_TIMEOUT = 5 * 60
+# Адрес сайта для прогрева кеша командой warm_caches: ссылки в ответах
+# абсолютные и входят в ключи кеша.
+CACHE_WARM_URL = os.getenv('CACHE_WARM_URL', default='http://localhost')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -108,16 +141,63 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttles.UserScopedThrottle',
+        'api.throttles.IPScopedThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'toggle': '120/min',
+        'toggle_ip': '600/min',
+        'recipe_create': '30/hour',
+        'recipe_create_ip': '120/hour',
+        'shopping_list': '30/hour',
+        'shopping_list_ip': '120/hour',
+    },
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.'
                                 'PageNumberPagination',
     'PAGE_SIZE': 6
 }
+
+THROTTLE_CACHE_ALIAS = 'throttle'
+
+# Время жизни снимка пользователя в кеше токенов: столько может
+# действовать деактивация, сделанная в обход сигналов (QuerySet.update()).
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
+# Лента подписок: рецепты авторов с большим числом подписчиков не
+# раскладываются по лентам, а подмешиваются при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BACKFILL_SIZE = 100
+
+# Сжатие ответов API (api.middleware.CompressionMiddleware).
+COMPRESSION_PATH_PREFIXES = ('/api/',)
+COMPRESSION_MIN_LENGTH = 1024
+BROTLI_QUALITY = 5
+
+# Инкрементальная синхронизация (/api/sync/): размер пакета изменений и
+# задержка, после которой запись журнала изменений видна клиентам, для баз
+# без номеров транзакций (в PostgreSQL видимость определяется по снимку).
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 1000
+SYNC_LAG_SECONDS = 5
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -141,6 +221,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/recipes_media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'recipes_media')
 
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
 # djoser settings
 
 DJOSER = {
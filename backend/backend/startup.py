@@ -0,0 +1,21 @@
+"""Настройка процесса веб-сервера до импорта Django.
+
+DRF при импорте пробует подключить необязательные пакеты для legacy
+CoreAPI-схем и YAML-рендерера схем. Веб-серверу они не нужны (схема API
+отдаётся готовым файлом docs/openapi-schema.yml), а их загрузка занимает
+заметную часть старта воркера. skip_optional_modules() помечает их
+недоступными; вызывается только из gunicorn.conf.py, поэтому
+management-команды (generateschema, dumpdata --format yaml) работают
+как обычно.
+"""
+import os
+import sys
+
+SERVER_SKIPPED_MODULES = ('coreapi', 'coreschema', 'uritemplate', 'yaml')
+
+
+def skip_optional_modules():
+    if os.getenv('GUNICORN_LOAD_OPTIONAL_MODULES', 'False') == 'True':
+        return
+    for module in SERVER_SKIPPED_MODULES:
+        sys.modules.setdefault(module, None)
@@ -0,0 +1,78 @@
+"""Настройки gunicorn для продакшена.
+
+Приложение Django загружается в мастер-процессе до форка воркеров
+(preload_app), кеш прогревается там же, поэтому воркеры
+получают уже импортированный код и заполненный кеш через copy-on-write.
+"""
+import os
+
+from backend.startup import skip_optional_modules
+
+skip_optional_modules()
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+CPU_COUNT = _cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Django-вьюхи в основном ждут базу, поэтому по умолчанию потоки внутри
+# воркеров: 2 * ядра + 1 процессов, но не больше GUNICORN_MAX_WORKERS.
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    min(CPU_COUNT * 2 + 1, int(os.getenv('GUNICORN_MAX_WORKERS', 8)))))
+threads = int(os.getenv('GUNICORN_THREADS', 4 if CPU_COUNT <= 2 else 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS',
+                         'gthread' if threads > 1 else 'sync')
+
+preload_app = True
+
+# Перезапуск воркеров ограничивает рост памяти; разброс не даёт всем
+# воркерам перезапуститься одновременно.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    """Прогрев кеша в мастере перед форком воркеров.
+
+    По умолчанию прогреваются справочники; при GUNICORN_WARM_CACHES=1 —
+    всё, что прогревает команда warm_caches, с ограничением времени
+    GUNICORN_WARM_CACHES_BUDGET секунд.
+    """
+    if not server.cfg.preload_app:
+        return
+
+    from django.core.cache import caches
+    from django.core.management import call_command
+    from django.db import connections
+
+    from api.cache import warm_reference_cache
+
+    try:
+        if os.getenv('GUNICORN_WARM_CACHES') == '1':
+            call_command('warm_caches', time_budget=float(os.getenv(
+                'GUNICORN_WARM_CACHES_BUDGET', 30)))
+        else:
+            server.log.info('Кеш справочников прогрет: %s',
+                            warm_reference_cache())
+    except Exception as error:
+        server.log.warning('Не удалось прогреть кеш: %s', error)
+    finally:
+        # Соединения мастера не должны наследоваться воркерами.
+        connections.close_all()
+        for cache in caches.all():
+            cache.close()
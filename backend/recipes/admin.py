@@ -1,19 +1,53 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.admin import ModelAdmin, TabularInline
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+from .deletion import schedule_recipe_deletion
+from .models import (DeletionJob, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, ShoppingCart, Tag)
+from .paginators import EstimatedCountPaginator
+from .services import add_recipe, refresh_cart_totals, remove_recipe
+
+
+class LargeTableAdmin(ModelAdmin):
+    """Настройки списка объектов для таблиц с миллионами строк."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class CookingTimeFilter(admin.SimpleListFilter):
+    """Фильтр по диапазонам времени приготовления."""
+    title = 'Время приготовления'
+    parameter_name = 'cooking_time'
+    ranges = {
+        'fast': ('до 15 минут', {'cooking_time__lt': 15}),
+        'medium': ('15–60 минут', {'cooking_time__gte': 15,
+                                  'cooking_time__lte': 60}),
+        'long': ('больше часа', {'cooking_time__gt': 60}),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, title) for key, (title, _) in self.ranges.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() in self.ranges:
+            return queryset.filter(**self.ranges[self.value()][1])
+        return queryset
 
 
 class IngredientInline(TabularInline):
     model = RecipeIngredient
     extra = 2
+    autocomplete_fields = ('ingredient',)
  
    
 @admin.register(Ingredient)
 class IngredientAdmin(ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
+    ordering = ('name',)
 
 
 @admin.register(Tag)
@@ -25,11 +59,12 @@ class TagAdmin(ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     list_display = ('name', 'author', 'pub_date', 'display_tags',
                     'favorite',)
-    list_filter = ('name', 'author', 'tags')
-    search_fields = ('name',)
+    list_filter = ('is_active', 'tags', 'pub_date', CookingTimeFilter)
+    search_fields = ('name', 'author__username', 'author__email')
+    autocomplete_fields = ('author', 'tags')
     readonly_fields = ('favorite',)
     fields = ('image',
               ('name', 'author'),
@@ -39,23 +74,106 @@ class RecipeAdmin(ModelAdmin):
 
     inlines = (IngredientInline,)
     
+    def get_queryset(self, request):
+        favorites = Favorite.objects.filter(recipe=OuterRef('pk')).order_by(
+            ).values('recipe').annotate(count=Count('id')).values('count')
+        return super().get_queryset(request).select_related(
+            'author').prefetch_related('tags').annotate(
+            favorites_count=Coalesce(Subquery(favorites,
+                                              output_field=IntegerField()),
+                                     0))
+    
+    @admin.display(description='Теги')
     def display_tags(self, obj):
         return ', '.join([tag.name for tag in obj.tags.all()])
 
+    @admin.display(description='В избранном',
+                   ordering='favorites_count')
     def favorite(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        # Ингредиенты из инлайна меняют итоги списков покупок.
+        with refresh_cart_totals(form.instance):
+            super().save_related(request, form, formsets, change)
+
+    def delete_model(self, request, obj):
+        schedule_recipe_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            schedule_recipe_deletion(recipe)
 
 
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdmin):
+    """Только просмотр: ингредиенты меняются в форме рецепта, где
+    пересчитываются итоги списков покупок."""
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ('recipe', 'user')
+    list_select_related = ('recipe', 'user')
+    autocomplete_fields = ('recipe', 'user')
+
+
+class ShoppingCartForm(forms.ModelForm):
+
+    class Meta:
+        model = ShoppingCart
+        fields = ('user', 'recipe')
+
+    def clean(self):
+        data = super().clean()
+        if ShoppingCart.objects.filter(user=data.get('user'),
+                                       recipe=data.get('recipe')).exists():
+            raise forms.ValidationError(
+                'Рецепт уже есть в списке покупок пользователя.')
+        return data
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
+    """Добавление и удаление через recipes.services, с пересчётом итогов
+    списков покупок; изменить запись нельзя."""
+    form = ShoppingCartForm
     list_display = ('recipe', 'user')
+    list_select_related = ('recipe', 'user')
+    autocomplete_fields = ('recipe', 'user')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        obj.pk = add_recipe(ShoppingCart, obj.user, obj.recipe).pk
+
+    def delete_model(self, request, obj):
+        remove_recipe(ShoppingCart, obj.user, obj.recipe_id)
+
+    def delete_queryset(self, request, queryset):
+        for item in queryset.select_related('user'):
+            remove_recipe(ShoppingCart, item.user, item.recipe_id)
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(ModelAdmin):
+    list_display = ('kind', 'object_id', 'status', 'step', 'deleted_rows',
+                    'created', 'finished')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('kind', 'object_id', 'status', 'step', 'deleted_rows',
+                       'error', 'created', 'finished')
+
+    def has_add_permission(self, request):
+        return False
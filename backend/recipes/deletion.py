@@ -0,0 +1,166 @@
+"""Фоновое удаление рецептов и пользователей.
+
+Удаление через Model.delete() собирает в памяти все зависимые записи и
+удаляет их одной долгой транзакцией. Вместо этого объект сразу скрывается
+(is_active=False) и ставится задание DeletionJob, а команда
+process_deletions удаляет зависимые записи пакетами по batch_size строк
+запросами DELETE ... WHERE id IN (...), каждый пакет в своей короткой
+транзакции. Файлы изображений не удаляются: их может использовать
+другой рецепт или рецепт, который ещё сохраняется, неиспользуемые файлы
+старше заданного возраста удаляет команда collect_media_garbage.
+"""
+from collections import defaultdict
+
+from django.contrib.admin.models import LogEntry
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from rest_framework.authtoken.models import Token
+
+from users.models import Follow, User
+from .models import (DeletionJob, Favorite, FeedEntry, Recipe,
+                     RecipeIngredient, ShoppingCart, ShoppingCartIngredient,
+                     SimilarRecipe)
+from .services import remove_cart_totals, touch_recipes
+
+# Записи, которые удаляются вместе с рецептом: (модель, поле-ссылка).
+# Записи списков покупок удаляются отдельно, с пересчётом итогов.
+RECIPE_DEPENDENTS = (
+    (RecipeIngredient, 'recipe'),
+    (Recipe.tags.through, 'recipe'),
+    (Favorite, 'recipe'),
+    (FeedEntry, 'recipe'),
+    (SimilarRecipe, 'recipe'),
+    (SimilarRecipe, 'similar'),
+)
+# Записи, которые удаляются вместе с пользователем после его рецептов.
+USER_DEPENDENTS = (
+    (Favorite, 'user'),
+    (ShoppingCartIngredient, 'user'),
+    (FeedEntry, 'user'),
+    (FeedEntry, 'author'),
+    (Follow, 'user'),
+    (Follow, 'author'),
+    (Token, 'user'),
+    (LogEntry, 'user'),
+    (User.groups.through, 'user'),
+    (User.user_permissions.through, 'user'),
+)
+
+
+def schedule_recipe_deletion(recipe):
+    """Скрывает рецепт и ставит задание на его удаление."""
+    with transaction.atomic():
+        touch_recipes(Recipe.objects.filter(pk=recipe.pk), is_active=False)
+        DeletionJob.objects.get_or_create(kind=DeletionJob.RECIPE,
+                                          object_id=recipe.pk)
+
+
+def schedule_user_deletion(user):
+    """Скрывает пользователя с его рецептами и ставит задание на удаление."""
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=('is_active',))
+        touch_recipes(Recipe.objects.filter(author=user), is_active=False)
+        DeletionJob.objects.get_or_create(kind=DeletionJob.USER,
+                                          object_id=user.pk)
+
+
+def raw_delete(model, ids):
+    """DELETE ... WHERE pk IN (...) без сборщика каскадов Django."""
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} IN ({placeholders})', ids)
+        return cursor.rowcount
+
+
+class DeletionRunner:
+    """Выполняет задание DeletionJob пакетами по batch_size записей.
+
+    report(job) вызывается после каждого пакета, прогресс сохраняется в
+    полях step и deleted_rows задания.
+    """
+
+    def __init__(self, job, batch_size=1000, report=None):
+        self.job = job
+        self.batch_size = batch_size
+        self.report = report or (lambda job: None)
+
+    def run(self):
+        try:
+            if self.job.kind == DeletionJob.RECIPE:
+                self.delete_recipes((self.job.object_id,))
+            else:
+                self.delete_user(self.job.object_id)
+        except Exception as error:
+            self.finish(DeletionJob.FAILED, repr(error))
+            raise
+        self.finish(DeletionJob.DONE)
+
+    def finish(self, status, error=''):
+        DeletionJob.objects.filter(pk=self.job.pk).update(
+            status=status, error=error, finished=Now())
+        self.job.refresh_from_db()
+        self.report(self.job)
+
+    def progress(self, step, deleted):
+        self.job.step = step
+        self.job.deleted_rows += deleted
+        DeletionJob.objects.filter(pk=self.job.pk).update(
+            step=step, deleted_rows=F('deleted_rows') + deleted)
+        self.report(self.job)
+
+    def delete_rows(self, model, field, values):
+        step = f'{model._meta.label}.{field}'
+        rows = model.objects.filter(**{f'{field}_id__in': values})
+        while True:
+            ids = list(rows.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            with transaction.atomic():
+                self.progress(step, raw_delete(model, ids))
+
+    def delete_cart_rows(self, field, values):
+        """Удаляет записи списков покупок, вычитая рецепты из итогов."""
+        rows = ShoppingCart.objects.filter(**{f'{field}_id__in': values})
+        while True:
+            batch = list(rows.values_list('pk', 'user_id', 'recipe_id')[
+                :self.batch_size])
+            if not batch:
+                return
+            users_by_recipe = defaultdict(list)
+            for _, user_id, recipe_id in batch:
+                users_by_recipe[recipe_id].append(user_id)
+            with transaction.atomic():
+                for recipe_id, user_ids in users_by_recipe.items():
+                    remove_cart_totals(user_ids, (recipe_id,))
+                self.progress(f'{ShoppingCart._meta.label}.{field}',
+                              raw_delete(ShoppingCart,
+                                         [pk for pk, _, _ in batch]))
+
+    def delete_recipes(self, recipe_ids):
+        self.delete_cart_rows('recipe', recipe_ids)
+        for model, field in RECIPE_DEPENDENTS:
+            self.delete_rows(model, field, recipe_ids)
+        with transaction.atomic():
+            self.progress('recipes.Recipe', raw_delete(Recipe, recipe_ids))
+
+    def delete_user(self, user_id):
+        recipes = Recipe.objects.filter(author_id=user_id)
+        while True:
+            recipe_ids = list(recipes.values_list('id', flat=True)[
+                :self.batch_size])
+            if not recipe_ids:
+                break
+            self.delete_recipes(recipe_ids)
+        self.delete_cart_rows('user', (user_id,))
+        for model, field in USER_DEPENDENTS:
+            self.delete_rows(model, field, (user_id,))
+        with transaction.atomic():
+            # Оставшиеся зависимости (если появятся новые модели) удалит
+            # обычный каскад Django.
+            deleted, _ = User.objects.filter(pk=user_id).delete()
+            self.progress('users.User', deleted)
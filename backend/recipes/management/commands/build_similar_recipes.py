@@ -0,0 +1,47 @@
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import SimilarRecipe
+from recipes.similarity import similar_recipes
+
+
+class Command(BaseCommand):
+    """Пересчёт таблицы похожих рецептов."""
+    help = ('Считает похожие рецепты по избранному (косинусная мера) и '
+            'ингредиентам (мера Жаккара) и заменяет ими таблицу '
+            'SimilarRecipe. Запускается по расписанию.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=10,
+                            help='Сколько похожих рецептов хранить.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Сколько рецептов сравнивать за раз.')
+        parser.add_argument('--favorite-weight', type=float, default=0.7)
+        parser.add_argument('--ingredient-weight', type=float, default=0.3)
+        parser.add_argument('--min-score', type=float, default=0.01)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = (SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id,
+                              score=score)
+                for recipe_id, similar_id, score in similar_recipes(
+                    top_k=options['top_k'], chunk_size=options['chunk_size'],
+                    favorite_weight=options['favorite_weight'],
+                    ingredient_weight=options['ingredient_weight'],
+                    min_score=options['min_score']))
+        created = 0
+        with transaction.atomic():
+            SimilarRecipe.objects.all().delete()
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                SimilarRecipe.objects.bulk_create(batch)
+                created += len(batch)
+        self.stdout.write(f'Сохранено пар: {created} за '
+                          f'{time.perf_counter() - started:.1f} с')
@@ -0,0 +1,65 @@
+import posixpath
+from datetime import timedelta
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def iter_files(storage, path):
+    """Обходит каталог хранилища, не собирая список файлов целиком."""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from iter_files(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    """Удаление изображений, на которые не ссылается ни один рецепт."""
+    help = ('Удаляет из каталога изображений рецептов файлы, которые не '
+            'используются ни одним рецептом.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько файлов проверять одним запросом.')
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Не трогать файлы моложе этого возраста: '
+                                 'рецепт с ними может ещё сохраняться.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        storage = field.storage
+        if not storage.exists(field.upload_to):
+            self.stdout.write('Каталог изображений пуст.')
+            return
+
+        threshold = timezone.now() - timedelta(
+            minutes=options['grace_minutes'])
+        files = iter_files(storage, field.upload_to)
+        checked = removed = 0
+        while True:
+            batch = list(islice(files, options['batch_size']))
+            if not batch:
+                break
+            checked += len(batch)
+            used = set(Recipe.objects.filter(image__in=batch).values_list(
+                'image', flat=True))
+            for name in batch:
+                if name in used or storage.get_modified_time(
+                        name) > threshold:
+                    continue
+                removed += 1
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+
+        action = 'к удалению' if options['dry_run'] else 'удалено'
+        self.stdout.write(f'Проверено файлов: {checked}, {action}: '
+                          f'{removed}')
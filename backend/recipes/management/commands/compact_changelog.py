@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+from django.db.models import Exists, Max, Min, OuterRef, Q
+
+from recipes.models import ChangeLog
+
+
+class Command(BaseCommand):
+    """Сжатие журнала изменений синхронизации."""
+    help = ('Удаляет записи ChangeLog, для объекта которых есть более '
+            'поздняя запись. Клиент с любым токеном получит объект по '
+            'последней записи, поэтому выданные токены остаются верными.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Сколько записей проверять за один шаг.')
+
+    def handle(self, *args, **options):
+        bounds = ChangeLog.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('Журнал изменений пуст.')
+            return
+
+        # Более поздняя — по позиции (txid, id), в которой читает клиент.
+        newer = ChangeLog.objects.filter(
+            Q(txid__gt=OuterRef('txid'))
+            | Q(txid=OuterRef('txid'), id__gt=OuterRef('id')),
+            kind=OuterRef('kind'), object_id=OuterRef('object_id'))
+        removed = 0
+        for start in range(bounds['first'], bounds['last'] + 1,
+                           options['batch_size']):
+            deleted, _ = ChangeLog.objects.filter(
+                id__gte=start, id__lt=start + options['batch_size']).filter(
+                Exists(newer)).delete()
+            removed += deleted
+        self.stdout.write(f'Удалено устаревших записей: {removed}')
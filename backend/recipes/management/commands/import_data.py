@@ -4,7 +4,8 @@ from csv import DictReader
 
 from django.core.management import BaseCommand
 
-from recipes.models import Ingredient
+from recipes.models import ChangeLog, Ingredient
+from recipes.services import log_changes
 
 DATA_DIR = 'static/data/'
 DATA_PATCH = {
@@ -16,14 +17,17 @@ logging.getLogger().setLevel(logging.INFO)
 
 class Command(BaseCommand):
     """ Команда для загрузки данных в БД"""
+    requires_system_checks = []
 
     def handle(self, *args, **options):
-        Ingredient.objects.bulk_create(
+        ingredients = Ingredient.objects.bulk_create(
             [Ingredient(id=row['id'], name=row['name'],
                         measurement_unit=row['measurement_unit'])
              for row in DictReader(
                 open(DATA_PATCH['ingredients'], encoding='utf-8'))
              ]
         )
+        log_changes(ChangeLog.INGREDIENT,
+                    [ingredient.id for ingredient in ingredients])
 
         logging.info('База Ингредиентов загружена')
\ No newline at end of file
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.deletion import DeletionRunner
+from recipes.models import DeletionJob
+
+
+class Command(BaseCommand):
+    """Обработчик заданий на фоновое удаление."""
+    help = ('Выполняет задания DeletionJob: удаляет зависимые записи '
+            'рецептов и пользователей пакетами и сообщает о прогрессе.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько записей удалять одним запросом.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Не завершаться, ждать новые задания.')
+        parser.add_argument('--sleep', type=float, default=5,
+                            help='Пауза между проверками в режиме --loop.')
+        parser.add_argument('--retry', action='store_true',
+                            help='Перезапустить задания с ошибкой и '
+                                 'прерванные.')
+
+    def handle(self, *args, **options):
+        if options['retry']:
+            DeletionJob.objects.filter(status__in=(
+                DeletionJob.FAILED, DeletionJob.RUNNING)).update(
+                status=DeletionJob.PENDING, error='')
+        while True:
+            job = self.claim()
+            if job is not None:
+                self.process(job, options['batch_size'])
+            elif options['loop']:
+                time.sleep(options['sleep'])
+            else:
+                break
+
+    def claim(self):
+        """Берёт ожидающее задание так, чтобы его не взял другой процесс."""
+        for job in DeletionJob.objects.filter(status=DeletionJob.PENDING):
+            if DeletionJob.objects.filter(
+                    pk=job.pk, status=DeletionJob.PENDING).update(
+                    status=DeletionJob.RUNNING):
+                job.status = DeletionJob.RUNNING
+                return job
+        return None
+
+    def process(self, job, batch_size):
+        self.stdout.write(f'{job}: начато')
+        try:
+            DeletionRunner(job, batch_size, self.report).run()
+        except Exception as error:
+            self.stderr.write(f'{job}: ошибка {error!r}')
+
+    def report(self, job):
+        if job.status == DeletionJob.RUNNING:
+            self.stdout.write(f'{job}: {job.step}, удалено записей: '
+                              f'{job.deleted_rows}')
+        else:
+            self.stdout.write(f'{job}: {job.get_status_display().lower()}, '
+                              f'удалено записей: {job.deleted_rows}')
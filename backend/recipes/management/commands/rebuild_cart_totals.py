@@ -0,0 +1,78 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from recipes.models import ShoppingCart, ShoppingCartIngredient
+
+INGREDIENT = 'recipe__recipe_ingredient__ingredient_id'
+
+
+class Command(BaseCommand):
+    """Сверка и пересборка итогов списков покупок."""
+    help = ('Пересчитывает итоги списков покупок из ShoppingCart и '
+            'RecipeIngredient и исправляет расхождения.')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сообщить о расхождениях.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Сколько пользователей сверять за раз.')
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(ShoppingCart.objects.values_list('user_id', flat=True))
+            | set(ShoppingCartIngredient.objects.values_list('user_id',
+                                                             flat=True)))
+        batch_size = options['batch_size']
+        mismatched = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            with transaction.atomic():
+                mismatched += self.reconcile(batch, options['check'])
+
+        if options['check']:
+            self.stdout.write(f'Пользователей: {len(user_ids)}, '
+                              f'расхождений: {mismatched}')
+        else:
+            self.stdout.write(f'Пользователей: {len(user_ids)}, '
+                              f'исправлено записей: {mismatched}')
+
+    def reconcile(self, user_ids, check):
+        expected = {
+            (row['user_id'], row[INGREDIENT]): (row['amount'],
+                                                row['recipe_count'])
+            for row in ShoppingCart.objects.filter(
+                user_id__in=user_ids,
+                **{f'{INGREDIENT}__isnull': False}).values(
+                'user_id', INGREDIENT).annotate(
+                amount=Sum('recipe__recipe_ingredient__amount'),
+                recipe_count=Count('recipe_id')).order_by()
+        }
+        actual = {
+            (item.user_id, item.ingredient_id): item
+            for item in ShoppingCartIngredient.objects.filter(
+                user_id__in=user_ids).select_for_update()
+        }
+
+        missing = expected.keys() - actual.keys()
+        extra = [item.id for key, item in actual.items()
+                 if key not in expected]
+        changed = []
+        for key, (amount, recipe_count) in expected.items():
+            item = actual.get(key)
+            if item is not None and (item.amount, item.recipe_count) != (
+                    amount, recipe_count):
+                item.amount, item.recipe_count = amount, recipe_count
+                changed.append(item)
+
+        if not check:
+            ShoppingCartIngredient.objects.filter(id__in=extra).delete()
+            ShoppingCartIngredient.objects.bulk_update(
+                changed, ('amount', 'recipe_count'))
+            ShoppingCartIngredient.objects.bulk_create(
+                ShoppingCartIngredient(user_id=key[0], ingredient_id=key[1],
+                                       amount=expected[key][0],
+                                       recipe_count=expected[key][1])
+                for key in missing)
+        return len(missing) + len(extra) + len(changed)
@@ -0,0 +1,159 @@
+import base64
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import transaction
+from django.db.models import Max
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (ChangeLog, Favorite, FeedEntry, Ingredient,
+                            Recipe, RecipeIngredient, ShoppingCart, Tag)
+from recipes.services import log_changes
+from users.models import Follow, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+IMAGE = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwAD'
+    'hgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+class Command(BaseCommand):
+    """Генерация большого набора данных для нагрузочного тестирования."""
+    help = ('Создаёт пользователей с токенами, рецепты, избранное, списки '
+            'покупок и подписки пакетными вставками (bulk_create).')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Рецептов в списке покупок у пользователя.')
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок у пользователя.')
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс имён и почты пользователей.')
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--random-seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Нет ингредиентов: сначала выполните '
+                               'import_data.')
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        self.rng = random.Random(options['random_seed'])
+        self.batch_size = options['batch_size']
+        tag_ids = [Tag.objects.get_or_create(
+            slug=slug, defaults={'name': name, 'color': color})[0].id
+            for name, color, slug in TAGS]
+
+        with transaction.atomic():
+            user_ids = self.create_users(options)
+            recipes = self.create_recipes(options, user_ids, tag_ids,
+                                          ingredient_ids)
+            recipe_ids = list(recipes)
+            self.create_links(Favorite, user_ids, recipe_ids,
+                              options['favorites'])
+            self.create_links(ShoppingCart, user_ids, recipe_ids,
+                              options['cart'])
+            self.create_follows(user_ids, recipes, options['follows'])
+        # Журнал пишется после фиксации, короткой транзакцией: долгая
+        # транзакция задержала бы синхронизацию остальных изменений.
+        log_changes(ChangeLog.RECIPE, recipe_ids)
+        call_command('rebuild_cart_totals', stdout=self.stdout)
+        self.stdout.write(f'Создано пользователей: {len(user_ids)}, '
+                          f'рецептов: {len(recipe_ids)}')
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size,
+                                  ignore_conflicts=True)
+
+    def create_users(self, options):
+        start, prefix = last_id(User), options['prefix']
+        first = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(options['password'])
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{number}',
+                  email=f'{prefix}{number}@example.com',
+                  first_name='Пользователь', last_name=str(number),
+                  password=password)
+             for number in range(first, first + options['users'])),
+            batch_size=self.batch_size)
+        user_ids = list(User.objects.filter(id__gt=start).values_list(
+            'id', flat=True))
+        self.bulk_create(Token, (Token(key=Token.generate_key(),
+                                       user_id=user_id)
+                                 for user_id in user_ids))
+        return user_ids
+
+    def create_recipes(self, options, user_ids, tag_ids, ingredient_ids):
+        """Возвращает словарь id рецепта -> id автора."""
+        field = Recipe._meta.get_field('image')
+        image = field.storage.save(field.generate_filename(None, 'seed.png'),
+                                   ContentFile(IMAGE))
+        start = last_id(Recipe)
+        Recipe.objects.bulk_create(
+            (Recipe(name=f'Рецепт {number}', text='Описание рецепта.',
+                    cooking_time=self.rng.randint(5, 180),
+                    author_id=self.rng.choice(user_ids), image=image)
+             for number in range(options['recipes'])),
+            batch_size=self.batch_size)
+        recipes = dict(Recipe.objects.filter(id__gt=start).values_list(
+            'id', 'author_id'))
+
+        per_recipe = min(options['ingredients_per_recipe'],
+                         len(ingredient_ids))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipes
+            for tag_id in self.rng.sample(tag_ids,
+                                          self.rng.randint(1, 2))))
+        self.bulk_create(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=self.rng.randint(2, 500))
+            for recipe_id in recipes
+            for ingredient_id in self.rng.sample(ingredient_ids,
+                                                 per_recipe)))
+        return recipes
+
+    def create_links(self, model, user_ids, recipe_ids, count):
+        count = min(count, len(recipe_ids))
+        self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.rng.sample(recipe_ids, count)))
+
+    def create_follows(self, user_ids, recipes, count):
+        by_author = defaultdict(list)
+        for recipe_id, author_id in sorted(recipes.items(), reverse=True):
+            by_author[author_id].append(recipe_id)
+        count = min(count, len(user_ids) - 1)
+        follows = [
+            (user_id, author_id) for user_id in user_ids
+            for author_id in [author_id for author_id in self.rng.sample(
+                user_ids, count + 1) if author_id != user_id][:count]]
+        self.bulk_create(Follow, (Follow(user_id=user_id, author_id=author_id)
+                                  for user_id, author_id in follows))
+        self.bulk_create(FeedEntry, (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for user_id, author_id in follows
+            for recipe_id in by_author[author_id][
+                :settings.FEED_BACKFILL_SIZE]))
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-19 10:39
+
+from django.db import migrations, models
+
+
+def fill_changelog(apps, schema_editor):
+    ChangeLog = apps.get_model('recipes', 'ChangeLog')
+    sources = (
+        ('tag', apps.get_model('recipes', 'Tag').objects.all()),
+        ('ingredient', apps.get_model('recipes', 'Ingredient').objects.all()),
+        ('recipe', apps.get_model('recipes', 'Recipe').objects.filter(
+            is_active=True)),
+    )
+    for kind, objects in sources:
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(kind=kind, object_id=pk) for pk in objects.order_by(
+                'id').values_list('id', flat=True).iterator()),
+            batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_deletion_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('recipe', 'Рецепт'), ('tag', 'Тег'), ('ingredient', 'Ингредиент')], max_length=10, verbose_name='Тип объекта')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Изменение',
+                'verbose_name_plural': 'Журнал изменений',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['kind', 'object_id', 'id'], name='changelog_object_idx'),
+        ),
+        migrations.RunPython(fill_changelog, migrations.RunPython.noop),
+    ]
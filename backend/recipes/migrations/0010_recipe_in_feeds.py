@@ -0,0 +1,39 @@
+# Generated by Django 3.2.16 on 2026-10-19 11:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def mark_recipes_in_feeds(apps, schema_editor):
+    """Раньше при чтении подмешивались рецепты авторов, у которых сейчас
+    больше FEED_FANOUT_MAX_FOLLOWERS подписчиков; остальные разложены."""
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    heavy_authors = Follow.objects.values('author_id').annotate(
+        followers=Count('id')).filter(
+        followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS).values(
+        'author_id').order_by()
+    Recipe.objects.exclude(author_id__in=heavy_authors).update(in_feeds=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_changelog_txid'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='in_feeds',
+            field=models.BooleanField(default=False, verbose_name='Разложен по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('in_feeds', False)), fields=['author', '-id'], name='recipe_not_in_feeds_idx'),
+        ),
+        migrations.RunPython(mark_recipes_in_feeds,
+                             migrations.RunPython.noop),
+    ]
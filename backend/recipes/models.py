@@ -28,6 +28,7 @@ class Tag(models.Model):
     slug = models.SlugField(max_length=20, verbose_name='Слаг', unique=True)
     
     class Meta:
+        ordering = ('id',)
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
     
@@ -59,11 +60,21 @@ class Recipe(models.Model):
                                   related_name='recipes')
     pub_date = models.DateTimeField(auto_now=True,
                                     verbose_name='Дата публикации')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
+    is_active = models.BooleanField(default=True, verbose_name='Активен')
+    # Рецепт разложен по лентам подписчиков (FeedEntry). Пока нет —
+    # подмешивается в ленты при чтении (recipes.services.get_feed).
+    in_feeds = models.BooleanField(default=False,
+                                   verbose_name='Разложен по лентам')
     
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (models.Index(fields=('author', '-id'),
+                                condition=models.Q(in_feeds=False),
+                                name='recipe_not_in_feeds_idx'),)
     
     def __str__(self):
         return f'{self.name[:100]}'
@@ -83,6 +94,7 @@ class RecipeIngredient(models.Model):
                                   'больше одного'),))
     
     class Meta:
+        ordering = ('id',)
         verbose_name = 'Количество ингредиента'
         verbose_name_plural = 'Количество ингредиентов'
         constraints = [UniqueConstraint(fields=('recipe', 'ingredient'),
@@ -128,3 +140,153 @@ class ShoppingCart(models.Model):
     
     def __str__(self):
         return f'{self.user} добавил в корзину {self.recipe}'
+
+
+class ShoppingCartIngredient(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+
+    Поддерживается при добавлении/удалении рецептов из списка покупок и
+    при изменении ингредиентов рецепта (recipes.services), сверяется
+    командой rebuild_cart_totals.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             verbose_name='Пользователь',
+                             related_name='shopping_cart_ingredients')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    amount = models.IntegerField(verbose_name='Количество', default=0)
+    recipe_count = models.IntegerField(verbose_name='Количество рецептов',
+                                       default=0)
+    
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = (UniqueConstraint(fields=('user', 'ingredient'),
+                                        name='уникальные_ингредиенты_в_'
+                                             'списке_покупок'),)
+    
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} – {self.amount}'
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Заполняется при публикации рецепта (fan-out-on-write),
+    если у автора не больше FEED_FANOUT_MAX_FOLLOWERS подписчиков."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             verbose_name='Пользователь',
+                             related_name='feed_entries')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               verbose_name='Автор', related_name='+')
+    
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (UniqueConstraint(fields=('user', 'recipe'),
+                                        name='уникальные_рецепты_в_ленте'),)
+        indexes = (models.Index(fields=('user', 'author'),
+                                name='feed_user_author_idx'),)
+    
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт. Таблица целиком пересчитывается командой
+    build_similar_recipes по избранному и составу ингредиентов."""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               verbose_name='Рецепт',
+                               related_name='similar_recipes')
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                                verbose_name='Похожий рецепт',
+                                related_name='+')
+    score = models.FloatField(verbose_name='Сходство')
+    
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (UniqueConstraint(fields=('recipe', 'similar'),
+                                        name='уникальные_похожие_рецепты'),)
+    
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
+class DeletionJob(models.Model):
+    """Задание на фоновое удаление рецепта или пользователя.
+
+    Объект сразу скрывается (is_active=False), а связанные записи удаляет
+    пакетами команда process_deletions.
+    """
+    RECIPE = 'recipe'
+    USER = 'user'
+    KINDS = ((RECIPE, 'Рецепт'), (USER, 'Пользователь'))
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = ((PENDING, 'Ожидает'), (RUNNING, 'Выполняется'),
+                (DONE, 'Выполнено'), (FAILED, 'Ошибка'))
+    
+    kind = models.CharField(verbose_name='Тип объекта', max_length=10,
+                            choices=KINDS)
+    object_id = models.PositiveIntegerField(verbose_name='id объекта')
+    status = models.CharField(verbose_name='Статус', max_length=10,
+                              choices=STATUSES, default=PENDING)
+    step = models.CharField(verbose_name='Этап', max_length=100, blank=True)
+    deleted_rows = models.PositiveIntegerField(
+        verbose_name='Удалено записей', default=0)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+    created = models.DateTimeField(verbose_name='Создано', auto_now_add=True)
+    finished = models.DateTimeField(verbose_name='Завершено', null=True,
+                                    blank=True)
+    
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Задание на удаление'
+        verbose_name_plural = 'Задания на удаление'
+        constraints = (UniqueConstraint(fields=('kind', 'object_id'),
+                                        name='уникальные_задания_удаления'),)
+        indexes = (models.Index(fields=('status',),
+                                name='deletion_job_status_idx'),)
+    
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.object_id}'
+
+
+class ChangeLog(models.Model):
+    """Запись журнала изменений для инкрементальной синхронизации.
+
+    Записи читаются в порядке (txid, id), токен синхронизации — пара
+    txid-id последней полученной записи: клиент запрашивает /api/sync/ с
+    этим токеном и получает объекты, изменённые после него. txid — номер
+    транзакции PostgreSQL, записавшей изменение (0 в других базах). Запись
+    только отмечает, что объект изменился; текущее состояние (или
+    удаление) определяется при чтении.
+    """
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    KINDS = ((RECIPE, 'Рецепт'), (TAG, 'Тег'), (INGREDIENT, 'Ингредиент'))
+    
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(verbose_name='Тип объекта', max_length=10,
+                            choices=KINDS)
+    object_id = models.PositiveIntegerField(verbose_name='id объекта')
+    txid = models.BigIntegerField(verbose_name='Транзакция', default=0)
+    created = models.DateTimeField(verbose_name='Создано', auto_now_add=True)
+    
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = (models.Index(fields=('kind', 'object_id', 'id'),
+                                name='changelog_object_idx'),
+                   models.Index(fields=('txid', 'id'),
+                                name='changelog_position_idx'))
+    
+    def __str__(self):
+        return f'{self.id}: {self.get_kind_display()} {self.object_id}'
@@ -0,0 +1,345 @@
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BigIntegerField, Count, F, Q, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from users.models import Follow, User
+from .models import (ChangeLog, FeedEntry, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingCartIngredient)
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+
+
+def _results(ids, statuses):
+    return [{'id': pk, 'status': statuses[pk]} for pk in ids]
+
+
+def bulk_add(model, user, field, ids, targets):
+    """Добавляет связи user -> field для всех найденных в targets id.
+
+    Выполняется в одной транзакции: выборка существующих объектов, выборка
+    уже существующих связей и одна вставка с ignore_conflicts.
+    """
+    ids = list(dict.fromkeys(ids))
+    lookup = f'{field}_id__in'
+    with transaction.atomic():
+        found = set(targets.filter(id__in=ids).values_list('id', flat=True))
+        existing = set(model.objects.filter(
+            user=user, **{lookup: found}).values_list(f'{field}_id',
+                                                      flat=True))
+        statuses = {pk: NOT_FOUND if pk not in found
+                    else EXISTS if pk in existing else ADDED for pk in ids}
+        model.objects.bulk_create(
+            [model(user=user, **{f'{field}_id': pk})
+             for pk, status in statuses.items() if status == ADDED],
+            ignore_conflicts=True)
+    return _results(ids, statuses)
+
+
+def bulk_remove(model, user, field, ids):
+    """Удаляет связи user -> field одним DELETE ... WHERE field_id IN."""
+    ids = list(dict.fromkeys(ids))
+    items = model.objects.filter(user=user, **{f'{field}_id__in': ids})
+    with transaction.atomic():
+        existing = set(items.values_list(f'{field}_id', flat=True))
+        items.delete()
+    return _results(ids, {pk: REMOVED if pk in existing else ABSENT
+                          for pk in ids})
+
+
+def _lock_cart(user):
+    """Сериализует изменения списка покупок одного пользователя."""
+    list(User.objects.select_for_update().filter(pk=user.pk).values('pk'))
+
+
+def _lock_recipes(recipe_ids):
+    """Сериализует изменения списков покупок с заменой ингредиентов рецептов.
+
+    Итоги считаются по текущим ингредиентам рецепта, поэтому добавление в
+    список покупок и удаление из него ждут завершения правки ингредиентов
+    (refresh_cart_totals) и наоборот. Блокировка берётся до изменения
+    строк ShoppingCart и в порядке id, чтобы не было взаимных блокировок.
+    """
+    list(Recipe.objects.select_for_update().filter(
+        id__in=recipe_ids).order_by('id').values('pk'))
+
+
+def _change_cart_totals(user_ids, recipe_ids, sign):
+    deltas = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).values('ingredient_id').annotate(
+        amount=Sum('amount'), recipe_count=Count('id')).order_by()
+    if not user_ids or not deltas:
+        return
+    totals = ShoppingCartIngredient.objects.filter(user_id__in=user_ids)
+    if sign > 0:
+        ShoppingCartIngredient.objects.bulk_create(
+            [ShoppingCartIngredient(user_id=user_id,
+                                    ingredient_id=delta['ingredient_id'])
+             for user_id in user_ids for delta in deltas],
+            ignore_conflicts=True)
+    for delta in deltas:
+        totals.filter(ingredient_id=delta['ingredient_id']).update(
+            amount=F('amount') + sign * delta['amount'],
+            recipe_count=F('recipe_count') + sign * delta['recipe_count'])
+    if sign < 0:
+        totals.filter(recipe_count__lte=0).delete()
+
+
+def add_cart_totals(user_ids, recipe_ids):
+    """Добавляет ингредиенты рецептов в итоги списков покупок."""
+    _change_cart_totals(user_ids, recipe_ids, 1)
+
+
+def remove_cart_totals(user_ids, recipe_ids):
+    """Вычитает ингредиенты рецептов из итогов списков покупок."""
+    _change_cart_totals(user_ids, recipe_ids, -1)
+
+
+@contextmanager
+def refresh_cart_totals(recipe):
+    """Пересчёт итогов списков покупок при замене ингредиентов рецепта."""
+    with transaction.atomic():
+        _lock_recipes((recipe.id,))
+        user_ids = list(ShoppingCart.objects.select_for_update().filter(
+            recipe=recipe).values_list('user_id', flat=True))
+        remove_cart_totals(user_ids, (recipe.id,))
+        yield
+        add_cart_totals(user_ids, (recipe.id,))
+
+
+def _uses_txid():
+    return connection.vendor == 'postgresql'
+
+
+def log_changes(kind, ids):
+    """Записывает изменение объектов в журнал синхронизации (ChangeLog)."""
+    txid = (RawSQL('txid_current()', (), output_field=BigIntegerField())
+            if _uses_txid() else 0)
+    ChangeLog.objects.bulk_create(
+        [ChangeLog(kind=kind, object_id=pk, txid=txid) for pk in ids],
+        batch_size=1000)
+
+
+def _finished(changes):
+    """Записи транзакций с номером меньше xmin текущего снимка: такие
+    транзакции завершены, а все новые записи получат номер не меньше
+    xmin и встанут после них."""
+    return changes.filter(txid__lt=RawSQL(
+        'txid_snapshot_xmin(txid_current_snapshot())', ()))
+
+
+def get_changes(txid, pk):
+    """Записи журнала после позиции (txid, pk), которые уже не изменятся.
+
+    В PostgreSQL отдаются только записи завершённых транзакций
+    (_finished), в других базах не отдаются записи последних
+    SYNC_LAG_SECONDS секунд.
+    """
+    changes = ChangeLog.objects.filter(
+        Q(txid__gt=txid) | Q(txid=txid, id__gt=pk)).order_by('txid', 'id')
+    if _uses_txid():
+        return _finished(changes)
+    return changes.filter(created__lte=timezone.now() - timedelta(
+        seconds=settings.SYNC_LAG_SECONDS))
+
+
+def get_last_change():
+    """Позиция (txid, id) последней записи журнала, после которой новые
+    записи уже не появятся; (0, 0), если журнал пуст.
+
+    Транзакция, которая ещё не завершена, может записать изменение с
+    меньшим id, чем уже видимые записи. Позиция учитывает её записи,
+    только когда она завершится, и тогда обязательно растёт. В SQLite
+    записи добавляются в порядке фиксации транзакций.
+    """
+    changes = ChangeLog.objects.order_by('-txid', '-id')
+    if _uses_txid():
+        changes = _finished(changes)
+    return changes.values_list('txid', 'id').first() or (0, 0)
+
+
+def touch_recipes(recipes, **fields):
+    """Отмечает изменение отображения рецептов (ETag, Last-Modified,
+    журнал синхронизации). fields — дополнительно обновляемые поля."""
+    with transaction.atomic():
+        log_changes(ChangeLog.RECIPE, recipes.values_list('id', flat=True))
+        recipes.update(updated=Now(), **fields)
+
+
+def touch_recipes_in_batches(recipe_ids, batch_size=1000):
+    """touch_recipes пакетами, каждый в своей короткой транзакции.
+
+    Для изменений, затрагивающих много рецептов (переименование тега,
+    автора): одна долгая транзакция держала бы xmin и задерживала
+    синхронизацию всех клиентов.
+    """
+    recipe_ids = sorted(set(recipe_ids))
+    for start in range(0, len(recipe_ids), batch_size):
+        touch_recipes(Recipe.objects.filter(
+            id__in=recipe_ids[start:start + batch_size]))
+
+
+def add_recipe(model, user, recipe):
+    """Добавляет рецепт в избранное или список покупок.
+
+    Повторное добавление отсекается ограничением уникальности в базе,
+    IntegrityError пробрасывается вызывающему коду.
+    """
+    with transaction.atomic():
+        if model is ShoppingCart:
+            _lock_cart(user)
+            _lock_recipes((recipe.id,))
+        with transaction.atomic():
+            item = model.objects.create(user=user, recipe=recipe)
+        if model is ShoppingCart:
+            add_cart_totals((user.id,), (recipe.id,))
+    return item
+
+
+def remove_recipe(model, user, recipe_id):
+    """Удаляет рецепт из избранного или списка покупок одним DELETE."""
+    with transaction.atomic():
+        if model is ShoppingCart:
+            _lock_cart(user)
+            _lock_recipes((recipe_id,))
+        deleted, _ = model.objects.filter(user=user,
+                                          recipe_id=recipe_id).delete()
+        if deleted and model is ShoppingCart:
+            remove_cart_totals((user.id,), (recipe_id,))
+    return bool(deleted)
+
+
+def _changed(results, status):
+    return [item['id'] for item in results if item['status'] == status]
+
+
+def add_recipes(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или список покупок."""
+    with transaction.atomic():
+        if model is ShoppingCart:
+            _lock_cart(user)
+            _lock_recipes(recipe_ids)
+        results = bulk_add(model, user, 'recipe', recipe_ids,
+                           Recipe.objects.filter(is_active=True))
+        if model is ShoppingCart:
+            add_cart_totals((user.id,), _changed(results, ADDED))
+    return results
+
+
+def remove_recipes(model, user, recipe_ids):
+    """Удаляет рецепты из избранного или списка покупок."""
+    with transaction.atomic():
+        if model is ShoppingCart:
+            _lock_cart(user)
+            _lock_recipes(recipe_ids)
+        results = bulk_remove(model, user, 'recipe', recipe_ids)
+        if model is ShoppingCart:
+            remove_cart_totals((user.id,), _changed(results, REMOVED))
+    return results
+
+
+def clear_recipes(model, user):
+    """Очищает избранное или список покупок пользователя."""
+    items = model.objects.filter(user=user)
+    with transaction.atomic():
+        if model is ShoppingCart:
+            _lock_cart(user)
+            user.shopping_cart_ingredients.all().delete()
+        recipe_ids = list(items.values_list('recipe_id', flat=True))
+        items.delete()
+    return _results(recipe_ids, dict.fromkeys(recipe_ids, REMOVED))
+
+
+def add_subscriptions(user, author_ids):
+    """Подписывает пользователя на авторов."""
+    with transaction.atomic():
+        results = bulk_add(Follow, user, 'author', author_ids,
+                           User.objects.filter(is_active=True).exclude(
+                               id=user.id))
+        backfill_feed(user, _changed(results, ADDED))
+    return results
+
+
+def remove_subscriptions(user, author_ids):
+    """Отписывает пользователя от авторов."""
+    with transaction.atomic():
+        results = bulk_remove(Follow, user, 'author', author_ids)
+        trim_feed(user, _changed(results, REMOVED))
+    return results
+
+
+def _is_heavy(author_id):
+    return Follow.objects.filter(author_id=author_id).count() > (
+        settings.FEED_FANOUT_MAX_FOLLOWERS)
+
+
+def publish_to_feeds(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора.
+
+    Рецепты авторов, у которых подписчиков больше
+    FEED_FANOUT_MAX_FOLLOWERS, не раскладываются: они остаются с
+    in_feeds=False и подмешиваются при чтении ленты (fan-out-on-read).
+    Решение принимается один раз, при публикации, и записывается в
+    рецепт, поэтому чтение ленты не зависит от числа подписчиков.
+    """
+    if _is_heavy(recipe.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, recipe=recipe,
+                       author_id=recipe.author_id) for user_id in followers),
+            ignore_conflicts=True, batch_size=1000)
+        Recipe.objects.filter(pk=recipe.pk).update(in_feeds=True)
+
+
+def backfill_feed(user, author_ids):
+    """Добавляет в ленту последние разложенные рецепты авторов после
+    подписки; остальные подмешиваются при чтении."""
+    entries = []
+    for author_id in author_ids:
+        recipe_ids = Recipe.objects.filter(
+            author_id=author_id, is_active=True, in_feeds=True).order_by(
+            '-id').values_list('id', flat=True)[
+            :settings.FEED_BACKFILL_SIZE]
+        entries += [FeedEntry(user=user, recipe_id=recipe_id,
+                              author_id=author_id)
+                    for recipe_id in recipe_ids]
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def trim_feed(user, author_ids):
+    """Убирает из ленты рецепты авторов после отписки."""
+    FeedEntry.objects.filter(user=user, author_id__in=author_ids).delete()
+
+
+def get_feed(user, before, limit):
+    """id рецептов ленты по убыванию, не больше limit, меньше before.
+
+    Ключ пагинации — id рецепта: он монотонно растёт при публикации и не
+    меняется при редактировании, в отличие от pub_date.
+    """
+    entries = FeedEntry.objects.filter(user=user, recipe__is_active=True)
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    recipe_ids = list(entries.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True)[:limit])
+
+    # Рецепты без записей ленты (in_feeds=False) подмешиваются при чтении.
+    recipes = Recipe.objects.filter(
+        author_id__in=Follow.objects.filter(user=user).values('author_id'),
+        in_feeds=False, is_active=True)
+    if before is not None:
+        recipes = recipes.filter(id__lt=before)
+    return sorted(set(recipe_ids).union(recipes.order_by('-id').values_list(
+        'id', flat=True)[:limit]), reverse=True)[:limit]
@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import User
+from .models import (ChangeLog, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .services import (log_changes, remove_cart_totals,
+                       touch_recipes_in_batches)
+
+LOGGED_MODELS = {Recipe: ChangeLog.RECIPE, Tag: ChangeLog.TAG,
+                 Ingredient: ChangeLog.INGREDIENT}
+# Поля пользователя, которые выводятся в рецептах как автор.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def touch_recipes_on_commit(recipe_ids):
+    """Отмечает изменение рецептов после фиксации текущей транзакции,
+    пакетами: сохранение тега или автора не растягивается на обновление
+    всех его рецептов. id выбираются сразу: при удалении тега связи
+    к моменту фиксации уже удалены."""
+    transaction.on_commit(partial(touch_recipes_in_batches,
+                                  list(recipe_ids)))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_cart_totals(sender, instance, **kwargs):
+    user_ids = list(ShoppingCart.objects.filter(
+        recipe=instance).values_list('user_id', flat=True))
+    remove_cart_totals(user_ids, (instance.id,))
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def touch_tag_recipes(instance, created=False, **kwargs):
+    if not created:
+        touch_recipes_on_commit(Recipe.tags.through.objects.filter(
+            tag=instance).values_list('recipe_id', flat=True))
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def touch_ingredient_recipes(instance, created=False, **kwargs):
+    if not created:
+        touch_recipes_on_commit(RecipeIngredient.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(pre_save, sender=User)
+def check_author_fields(instance, update_fields, **kwargs):
+    """Запоминает, изменились ли поля, которые видны в рецептах автора."""
+    fields = [name for name in AUTHOR_FIELDS
+              if update_fields is None or name in update_fields]
+    instance._author_changed = bool(
+        fields and not instance._state.adding
+        and User.objects.filter(pk=instance.pk).values_list(
+            *fields).first() != tuple(getattr(instance, name)
+                                      for name in fields))
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, **kwargs):
+    if not created and getattr(instance, '_author_changed', False):
+        touch_recipes_on_commit(Recipe.objects.filter(
+            author=instance).values_list('id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def log_change(sender, instance, **kwargs):
+    log_changes(LOGGED_MODELS[sender], (instance.pk,))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def log_recipe_ingredient_change(instance, **kwargs):
+    log_changes(ChangeLog.RECIPE, (instance.recipe_id,))
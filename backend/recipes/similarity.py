@@ -0,0 +1,72 @@
+"""Расчёт похожих рецептов для команды build_similar_recipes.
+
+Сходство рецептов — взвешенная сумма косинусной меры по пользователям,
+добавившим рецепты в избранное, и меры Жаккара по ингредиентам. Обе
+матрицы (рецепт x пользователь и рецепт x ингредиент) хранятся
+разреженными, попарное сходство считается блоками по chunk_size строк,
+поэтому память ограничена chunk_size x число рецептов.
+"""
+import numpy as np
+from scipy import sparse
+
+from .models import Favorite, Recipe, RecipeIngredient
+
+
+def _incidence_matrix(recipe_ids, pairs):
+    """Разреженная 0/1-матрица рецепт x объект по парам (рецепт, объект)."""
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    _, columns = np.unique(pairs[:, 1], return_inverse=True)
+    return sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), columns.max(initial=-1) + 1))
+
+
+def _normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def similar_recipes(top_k=10, chunk_size=500, favorite_weight=0.7,
+                    ingredient_weight=0.3, min_score=0.01):
+    """Генератор (recipe_id, similar_id, score), top_k на рецепт."""
+    recipe_ids = np.array(sorted(Recipe.objects.values_list('id', flat=True)),
+                          dtype=np.int64)
+    if len(recipe_ids) < 2:
+        return
+
+    favorites = _normalize_rows(_incidence_matrix(
+        recipe_ids, Favorite.objects.values_list('recipe_id', 'user_id')))
+    favorites_t = favorites.T.tocsr()
+    ingredients = _incidence_matrix(
+        recipe_ids, RecipeIngredient.objects.values_list('recipe_id',
+                                                         'ingredient_id'))
+    ingredients_t = ingredients.T.tocsr()
+    sizes = np.asarray(ingredients.sum(axis=1), dtype=np.float32).ravel()
+
+    top_k = min(top_k, len(recipe_ids) - 1)
+    for start in range(0, len(recipe_ids), chunk_size):
+        stop = min(start + chunk_size, len(recipe_ids))
+        cosine = (favorites[start:stop] @ favorites_t).toarray()
+
+        common = (ingredients[start:stop] @ ingredients_t).toarray()
+        union = sizes[start:stop, None] + sizes[None, :] - common
+        jaccard = np.divide(common, union, out=np.zeros_like(common),
+                            where=union > 0)
+
+        scores = favorite_weight * cosine + ingredient_weight * jaccard
+        rows = np.arange(stop - start)
+        scores[rows, rows + start] = -1
+        best = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        best_scores = scores[rows[:, None], best]
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        for row, (columns, values) in enumerate(zip(best, best_scores)):
+            recipe_id = int(recipe_ids[start + row])
+            for column, score in zip(columns, values):
+                if score < min_score:
+                    break
+                yield recipe_id, int(recipe_ids[column]), float(score)
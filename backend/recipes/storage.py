@@ -0,0 +1,43 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — sha256 его содержимого.
+
+    Файл сохраняется как <каталог>/<2 символа хеша>/<хеш><расширение>.
+    Одинаковые загрузки получают одно имя и хранятся один раз, а
+    содержимое файла по имени никогда не меняется, поэтому nginx может
+    отдавать такие файлы с Cache-Control: immutable. Файлы не удаляются
+    при замене или удалении рецепта: их могут использовать другие
+    рецепты, неиспользуемые файлы удаляет команда collect_media_garbage.
+    Повторная загрузка обновляет время изменения файла: сборщик не трогает
+    свежие файлы, и рецепт, который ещё сохраняется, не потеряет картинку.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest[:2],
+                              digest + extension)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Файл успел удалить сборщик мусора — сохраняем заново.
+                pass
+        return super().save(name, content, max_length)
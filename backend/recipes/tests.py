@@ -0,0 +1,217 @@
+from collections import defaultdict
+from unittest import mock
+
+from django.test import override_settings
+
+from api.tests import FoodgramTestCase, create_recipes
+from users.models import User
+from .deletion import DeletionRunner, schedule_recipe_deletion
+from .models import (DeletionJob, FeedEntry, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingCartIngredient)
+from .paginators import EstimatedCountPaginator
+from .services import (add_subscriptions, get_feed, publish_to_feeds,
+                       remove_subscriptions)
+
+
+class CartTotalsTest(FoodgramTestCase):
+    """Итоги списков покупок остаются верными при любых изменениях."""
+    users_count = 2
+    ingredients_count = 4
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.buyer = cls.users[1]
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com',
+            password='pass12345!')
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.get_client(self.buyer)
+        self.client.force_login(self.admin)
+
+    def assertTotals(self, user):
+        """Итоги совпадают с пересчётом из ShoppingCart и RecipeIngredient."""
+        expected = defaultdict(lambda: [0, 0])
+        for amount, ingredient_id in RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user=user).values_list(
+                'amount', 'ingredient_id'):
+            expected[ingredient_id][0] += amount
+            expected[ingredient_id][1] += 1
+        totals = {item.ingredient_id: [item.amount, item.recipe_count]
+                  for item in ShoppingCartIngredient.objects.filter(
+                      user=user)}
+        self.assertEqual(totals, dict(expected))
+
+    def add_to_cart(self, *recipes):
+        for recipe in recipes:
+            response = self.api.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+
+    def test_api_add_and_remove(self):
+        self.add_to_cart(*self.recipes)
+        self.assertTotals(self.buyer)
+        self.assertTrue(ShoppingCartIngredient.objects.exists())
+
+        response = self.api.delete(
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertTotals(self.buyer)
+
+    def test_api_edit_ingredients(self):
+        recipe = self.recipes[0]
+        self.add_to_cart(recipe)
+        response = self.get_client(recipe.author).patch(
+            f'/api/recipes/{recipe.pk}/', {'ingredients': [
+                {'id': self.ingredients[1].pk, 'amount': 7},
+                {'id': self.ingredients[3].pk, 'amount': 11}]},
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTotals(self.buyer)
+        self.assertEqual(ShoppingCartIngredient.objects.filter(
+            user=self.buyer).count(), 2)
+
+    def test_admin_add_and_delete(self):
+        response = self.client.post('/admin/recipes/shoppingcart/add/', {
+            'user': self.buyer.pk, 'recipe': self.recipes[0].pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertTotals(self.buyer)
+        response = self.client.post('/admin/recipes/shoppingcart/add/', {
+            'user': self.buyer.pk, 'recipe': self.recipes[0].pk})
+        self.assertEqual(response.status_code, 200)
+
+        self.add_to_cart(*self.recipes[1:])
+        item = ShoppingCart.objects.get(recipe=self.recipes[0])
+        self.client.post(f'/admin/recipes/shoppingcart/{item.pk}/delete/',
+                         {'post': 'yes'})
+        self.assertTotals(self.buyer)
+
+        self.client.post('/admin/recipes/shoppingcart/', {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(ShoppingCart.objects.values_list(
+                'pk', flat=True))})
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+    def test_admin_edit_ingredients(self):
+        recipe = self.recipes[0]
+        self.add_to_cart(recipe)
+        rows = list(recipe.recipe_ingredient.all())
+        data = {
+            'name': recipe.name, 'author': recipe.author_id,
+            'text': recipe.text, 'cooking_time': recipe.cooking_time,
+            'tags': [tag.pk for tag in recipe.tags.all()],
+            'recipe_ingredient-TOTAL_FORMS': len(rows) + 1,
+            'recipe_ingredient-INITIAL_FORMS': len(rows),
+            'recipe_ingredient-0-id': rows[0].pk,
+            'recipe_ingredient-0-recipe': recipe.pk,
+            'recipe_ingredient-0-ingredient': rows[0].ingredient_id,
+            'recipe_ingredient-0-amount': rows[0].amount + 100,
+            'recipe_ingredient-1-id': rows[1].pk,
+            'recipe_ingredient-1-recipe': recipe.pk,
+            'recipe_ingredient-1-ingredient': rows[1].ingredient_id,
+            'recipe_ingredient-1-amount': rows[1].amount,
+            'recipe_ingredient-1-DELETE': 'on',
+            'recipe_ingredient-2-recipe': recipe.pk,
+            'recipe_ingredient-2-ingredient': self.ingredients[1].pk,
+            'recipe_ingredient-2-amount': 7,
+        }
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.pk}/change/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            set(recipe.recipe_ingredient.values_list('ingredient_id',
+                                                     'amount')),
+            {(rows[0].ingredient_id, rows[0].amount + 100),
+             (self.ingredients[1].pk, 7)})
+        self.assertTotals(self.buyer)
+
+    def test_recipe_deletion(self):
+        self.add_to_cart(*self.recipes)
+        schedule_recipe_deletion(self.recipes[0])
+        DeletionRunner(DeletionJob.objects.get(
+            object_id=self.recipes[0].pk)).run()
+        self.assertTotals(self.buyer)
+        self.assertEqual(ShoppingCart.objects.count(), 2)
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTest(FoodgramTestCase):
+    """Лента подписок, когда автор переходит порог FEED_FANOUT_MAX_FOLLOWERS.
+
+    users[0] — автор, остальные — подписчики.
+    """
+    users_count = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author, *cls.followers = cls.users
+
+    def publish(self):
+        recipe = create_recipes([self.author], self.tags, self.ingredients,
+                                1)[0]
+        publish_to_feeds(recipe)
+        return recipe.pk
+
+    def assertFeed(self, user, recipe_ids):
+        self.assertEqual(get_feed(user, None, 10), recipe_ids)
+
+    def test_threshold(self):
+        first, second, third = self.followers
+        add_subscriptions(first, (self.author.pk,))
+        light = self.publish()
+        self.assertTrue(FeedEntry.objects.filter(user=first,
+                                                 recipe_id=light).exists())
+
+        # Второй подписчик: автор становится «тяжёлым», новые рецепты не
+        # раскладываются, но сразу видны в лентах.
+        add_subscriptions(second, (self.author.pk,))
+        self.assertFeed(second, [light])
+        heavy = self.publish()
+        self.assertFalse(FeedEntry.objects.filter(recipe_id=heavy).exists())
+        self.assertFeed(first, [heavy, light])
+        self.assertFeed(second, [heavy, light])
+
+        # Отписка возвращает автора под порог: рецепт, опубликованный
+        # без раскладки, остаётся в ленте.
+        remove_subscriptions(second, (self.author.pk,))
+        self.assertFeed(second, [])
+        self.assertFeed(first, [heavy, light])
+        again_light = self.publish()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=first, recipe_id=again_light).exists())
+        self.assertFeed(first, [again_light, heavy, light])
+
+        add_subscriptions(third, (self.author.pk,))
+        self.assertFeed(third, [again_light, heavy, light])
+
+
+class EstimatedCountPaginatorTest(FoodgramTestCase):
+    """Оценка числа строк по плану PostgreSQL."""
+    recipes_count = 3
+
+    def count(self, plan):
+        """count при ответе EXPLAIN в виде plan (как его отдаёт драйвер)."""
+        connection = mock.MagicMock(vendor='postgresql')
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (plan,)
+        with mock.patch('recipes.paginators.connections',
+                        {'default': connection}):
+            count = EstimatedCountPaginator(
+                Recipe.objects.filter(is_active=True), 20).count
+        sql = cursor.execute.call_args[0][0]
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+        return count
+
+    def test_estimate(self):
+        # psycopg2 разбирает json сам и отдаёт список.
+        self.assertEqual(self.count([{'Plan': {'Plan Rows': 50000}}]), 50000)
+        self.assertEqual(self.count('[{"Plan": {"Plan Rows": 20000}}]'),
+                         20000)
+
+    def test_small_estimate_uses_exact_count(self):
+        self.assertEqual(self.count([{'Plan': {'Plan Rows': 10}}]), 3)
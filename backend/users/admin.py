@@ -1,5 +1,7 @@
 from django.contrib import admin
 
+from recipes.deletion import schedule_user_deletion
+from recipes.paginators import EstimatedCountPaginator
 from .models import User
 
 
@@ -10,5 +12,14 @@ class UserAdmin(admin.ModelAdmin):
                     'email', 'first_name',
                     'last_name')
     search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+    list_filter = ('is_active', 'is_staff')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def delete_model(self, request, obj):
+        schedule_user_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            schedule_user_deletion(user)
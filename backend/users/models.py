@@ -24,6 +24,14 @@ class User(AbstractUser):
     
     def __str__(self):
         return self.username
+    
+    def refresh_from_db(self, using=None, fields=None):
+        # Пользователь из кеша аутентификации загружается с отложенными
+        # полями: при обращении к любому из них подгружаем все разом.
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = deferred
+        super().refresh_from_db(using, fields)
 
 
 class Follow(models.Model):